@@ -0,0 +1,246 @@
+# Benchmarks the hsmusicToSongs.py rebake on synthetic hsmusic-data trees, so we know how it scales before the real wiki grows
+# Requires the same pip install pyyaml numpy scipy as hsmusicToSongs.py
+# e.g. python benchmarkHsmusicToSongs.py --albums 100,200,400 --output benchmark.json --compare benchmark_old.json
+
+from typing import Callable, Optional, Tuple
+import yaml
+import os
+import json
+import random
+import datetime
+import platform
+import subprocess
+import tempfile
+import argparse
+import statistics
+import time
+import tracemalloc
+import logging
+
+import hsmusicToSongs as bake
+
+# same story as in hsmusicToSongs.py, the C dumper is much faster if pyyaml has it
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+file_path = os.path.dirname(os.path.realpath(__file__))
+
+STAGES = ['parse', 'load_slugs', 'reference_index', 'get_valid_songs', 'filter_songs', 'get_guesses_array', 'serialisation']
+
+def generate_synthetic_wiki(album_path: str, n_albums: int, tracks_per_album: int, references_per_track: int, fandom_ratio: float, seed: int = 612):
+    # writes n_albums album yamls shaped like the real hsmusic-data ones
+    # references lean heavily towards the earliest official tracks, like the real leitmotifs do (everything references
+    # Sburban Jungle, almost nothing references some random bonus track)
+    rng = random.Random(seed)
+    os.makedirs(album_path, exist_ok=True)
+    artists = [f'Synthetic Artist {index}' for index in range(max(4, n_albums // 4))]
+    official_names = []
+    for album_index in range(n_albums):
+        # the first album is always official so there's something to reference from the start
+        is_fandom = album_index > 0 and rng.random() < fandom_ratio
+        documents = [{
+            'Album': f'Synthetic Album {album_index}',
+            'Artists': rng.sample(artists, 2),
+            'Groups': ['Fandom'] if is_fandom else ['Official Discography'],
+        }]
+        for track_index in range(tracks_per_album):
+            track_name = f'Synthetic Track {album_index}-{track_index}'
+            track = {
+                'Track': track_name,
+                'Artists': rng.sample(artists, rng.randint(1, 3)),
+                'URLs': [f'https://www.youtube.com/watch?v=s{album_index}x{track_index}'],
+            }
+            if official_names:
+                references = set()
+                for _ in range(rng.randint(0, 2 * references_per_track)):
+                    referenced_name = official_names[int(len(official_names) * rng.random() ** 3)]
+                    # the wiki mixes plain names and track: slugs, so do we
+                    references.add(f'track:{bake.normalize_wiki_string(referenced_name)}' if rng.random() < 0.5 else referenced_name)
+                if references:
+                    track['Referenced Tracks'] = sorted(references)
+            documents.append(track)
+            if not is_fandom:
+                official_names.append(track_name)
+        with open(os.path.join(album_path, f'synthetic-album-{album_index}.yaml'), 'w', encoding='utf8') as f:
+            yaml.dump_all(documents, f, Dumper=SafeDumper, allow_unicode=True)
+
+def run_stages(album_path: str, jobs: int, measure: Callable) -> dict:
+    # runs the rebake on album_path one stage at a time, the same way get_game_data does but without touching
+    # the static folder, the parse cache or the snapshot. measure(stage, function) runs each stage and returns its result
+    records = measure('parse', lambda: list(bake.iter_album_records(album_path, jobs, use_cache=False)))
+    slugs_dict = measure('load_slugs', lambda: bake.load_slugs(records))
+    rereleases = [rerelease for record in records for rerelease in record['rereleases']]
+    reference_index = measure('reference_index', lambda: bake.ReferenceIndex(slugs_dict, rereleases))
+    songs, leitmotif_counter, official_slugs = measure('get_valid_songs', lambda: bake.get_valid_songs(reference_index, records))
+    filtered_songs = measure('filter_songs', lambda: bake.filter_songs(
+        songs, [], leitmotif_counter, official_slugs,
+        bake.COMMON_LEITMOTIF_THRESHOLD, bake.UNCOMMON_LEITMOTIF_THRESHOLD, bake.RARE_LEITMOTIF_THRESHOLD,
+        bake.MIN_LEITMOTIFS, bake.MAX_LEITMOTIFS
+    ))
+    guesses_array = measure('get_guesses_array', lambda: bake.get_guesses_array(
+        slugs_dict, leitmotif_counter,
+        bake.COMMON_LEITMOTIF_THRESHOLD, bake.UNCOMMON_LEITMOTIF_THRESHOLD, bake.RARE_LEITMOTIF_THRESHOLD
+    ))
+
+    def serialise():
+        # everything get_game_data writes, encoded the same way write_json does, minus the actual disk writes
+        guesses_json = [guess.to_json() for guess in sorted(guesses_array, key=lambda k: (-k.rarity, k.name))]
+        game_songs_json = [song.to_json() for song in filtered_songs]
+        game_schedule = bake.get_game_schedule(game_songs_json)
+        outputs = [
+            (guesses_json, True),
+            (bake.get_columnar_motifs(guesses_json), False),
+            (game_songs_json, True),
+            (game_schedule, False),
+            *((shard, False) for shard in bake.get_schedule_shards(game_schedule).values()),
+        ]
+        return sum(len(chunk) for data, indent in outputs for chunk in bake.iter_json_chunks(data, indent))
+    output_bytes = measure('serialisation', serialise)
+
+    return {
+        'albums': len(records),
+        'tracks': len(slugs_dict),
+        'songs': len(songs),
+        'playableSongs': len(filtered_songs),
+        'guesses': len(guesses_array),
+        'outputBytes': output_bytes,
+    }
+
+def benchmark_wiki(album_path: str, jobs: int, repeats: int) -> Tuple[dict, dict]:
+    # times every stage repeats times, then does one more run under tracemalloc for the peak memory of each stage
+    # tracemalloc slows everything down a lot, which is why it never runs during the timed runs
+    # peaks only cover the main process, so with --jobs above 1 the parse peak leaves out the workers
+    timings = {stage: [] for stage in STAGES}
+    peaks = {}
+
+    def timed(stage, function):
+        start = time.perf_counter()
+        result = function()
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    def traced(stage, function):
+        tracemalloc.reset_peak()
+        result = function()
+        peaks[stage] = tracemalloc.get_traced_memory()[1]
+        return result
+
+    for _ in range(repeats):
+        # otherwise every run would get the slugs from the previous one (or the generator) for free
+        bake.normalize_wiki_string.cache_clear()
+        counts = run_stages(album_path, jobs, timed)
+    bake.normalize_wiki_string.cache_clear()
+    tracemalloc.start()
+    try:
+        run_stages(album_path, jobs, traced)
+    finally:
+        tracemalloc.stop()
+
+    stages = {
+        stage: {
+            'seconds': timings[stage],
+            'medianSeconds': statistics.median(timings[stage]),
+            'peakBytes': peaks[stage],
+        }
+        for stage in STAGES
+    }
+    return stages, counts
+
+def get_git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', '-C', file_path, 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(results: dict, old_results: dict):
+    # prints how every stage of every size changed against an older results file, matching sizes by their parameters
+    old_runs = {json.dumps(run['parameters'], sort_keys=True): run for run in old_results['runs']}
+    print(f'Comparing against {old_results.get("gitRevision")} from {old_results.get("createdAt")}')
+    for run in results['runs']:
+        old_run = old_runs.get(json.dumps(run['parameters'], sort_keys=True))
+        if old_run is None:
+            print(f'{run["parameters"]["albums"]} albums: not in the old results')
+            continue
+        for stage in STAGES:
+            new_stage, old_stage = run['stages'][stage], old_run['stages'].get(stage)
+            if old_stage is None or not old_stage['medianSeconds']:
+                continue
+            time_ratio = new_stage['medianSeconds'] / old_stage['medianSeconds']
+            memory_ratio = new_stage['peakBytes'] / old_stage['peakBytes'] if old_stage['peakBytes'] else float('nan')
+            print(f'{run["parameters"]["albums"]} albums, {stage}: {time_ratio:.2f}x time, {memory_ratio:.2f}x peak memory')
+
+def print_run(run: dict):
+    parameters, counts = run['parameters'], run['counts']
+    print(f'{parameters["albums"]} albums, {counts["tracks"]} tracks, {counts["songs"]} songs, '
+          f'{counts["playableSongs"]} playable, {counts["guesses"]} guesses')
+    for stage in STAGES:
+        stage_result = run['stages'][stage]
+        print(f'  {stage:<18} {stage_result["medianSeconds"] * 1000:10.1f} ms {stage_result["peakBytes"] / (1024 * 1024):10.1f} MB peak')
+    print(f'  {"total":<18} {run["totalSeconds"] * 1000:10.1f} ms')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time every stage of the rebake on synthetic hsmusic-data trees.')
+    parser.add_argument('--albums', type=bake.parse_int_list, default=[100, 200, 400],
+                        help='comma-separated album counts, one synthetic wiki is benchmarked per count')
+    parser.add_argument('--tracks-per-album', type=int, default=20)
+    parser.add_argument('--references-per-track', type=int, default=3,
+                        help='average number of referenced tracks per track')
+    parser.add_argument('--fandom-ratio', type=float, default=0.6,
+                        help='share of the albums that are fandom rather than official')
+    parser.add_argument('--seed', type=int, default=612)
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='timed runs per wiki, the report keeps all of them and their median')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='worker processes used to parse the album files')
+    parser.add_argument('--data-path', default=None,
+                        help='where to generate the synthetic wikis, defaults to a temporary directory that gets deleted')
+    parser.add_argument('--output', default='benchmark.json',
+                        help='where to write the JSON results')
+    parser.add_argument('--compare', default=None,
+                        help='an older JSON results file to compare against')
+    args = parser.parse_args()
+
+    # the bake logs its progress all over the place, which would bury our own output
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+    logging.getLogger('hsmusicToSongs').setLevel(logging.ERROR)
+
+    results = {
+        'createdAt': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'gitRevision': get_git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': [],
+    }
+    with tempfile.TemporaryDirectory() as temporary_path:
+        data_path = args.data_path or temporary_path
+        for n_albums in args.albums:
+            parameters = {
+                'albums': n_albums,
+                'tracksPerAlbum': args.tracks_per_album,
+                'referencesPerTrack': args.references_per_track,
+                'fandomRatio': args.fandom_ratio,
+                'seed': args.seed,
+                'jobs': max(1, args.jobs),
+            }
+            album_path = os.path.join(data_path, f'synthetic-{n_albums}', 'album')
+            print(f'Generating {n_albums} synthetic albums in {album_path}...')
+            generate_synthetic_wiki(album_path, n_albums, args.tracks_per_album, args.references_per_track, args.fandom_ratio, args.seed)
+            stages, counts = benchmark_wiki(album_path, max(1, args.jobs), max(1, args.repeats))
+            run = {
+                'parameters': parameters,
+                'counts': counts,
+                'stages': stages,
+                'totalSeconds': sum(stage['medianSeconds'] for stage in stages.values()),
+            }
+            results['runs'].append(run)
+            print_run(run)
+
+    with open(args.output, 'w') as f:
+        f.write(json.dumps(results, indent=2))
+    print(f'Wrote {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare_results(results, json.loads(f.read()))
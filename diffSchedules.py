@@ -0,0 +1,200 @@
+# Compares two bakes of the schedule before deploying, and fails if a day players could already have played changed
+# Only needs the standard library, e.g.
+# python diffSchedules.py static/oldGameSongs/game_songs_2023_11_04.json static/schedule --old-motifs old_motifs.json --new-motifs static/game_motifs.min.json
+# Schedules can be any of game_songs.json, game_schedule.json, a schedule/ folder (or its manifest.json) or schedule_history.jsonl
+
+import argparse
+import datetime
+import json
+import os
+import sys
+
+# Same as in hsmusicToSongs.py, players east of UTC are already on tomorrow's song
+LOCK_AHEAD_DAYS = 1
+
+# Shown in full in the text report, the json report always has everything
+MAX_LISTED = 20
+
+def get_day_string(first_day: str, offset: int) -> str:
+    return (datetime.date.fromisoformat(first_day) + datetime.timedelta(days=offset)).isoformat()
+
+def iter_compact_schedule(compact_schedule: dict):
+    # the {firstDay, songs, schedule} format of game_schedule.json and the monthly shards, -1 means no song that day
+    for offset, song_index in enumerate(compact_schedule['schedule']):
+        if song_index != -1:
+            yield get_day_string(compact_schedule['firstDay'], offset), compact_schedule['songs'][song_index]
+
+def iter_schedule_songs(path: str):
+    # yields (day, song) from any format the bake has ever written
+    if os.path.isdir(path):
+        path = os.path.join(path, 'manifest.json')
+    if os.path.splitext(path)[1] == '.jsonl':
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    song = json.loads(line)
+                    yield song['day'], song
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        for song in data:
+            yield song['day'], song
+    elif 'months' in data:
+        for month in sorted(data['months']):
+            with open(os.path.join(os.path.dirname(path), data['months'][month]), 'r', encoding='utf-8') as f:
+                yield from iter_compact_schedule(json.load(f))
+    else:
+        yield from iter_compact_schedule(data)
+
+def get_song_key(song: dict) -> tuple:
+    # what makes two entries the same song, several tracks across albums can share a slug
+    return (song['slug'], song['name'], song['albumName'], song['url'])
+
+class Schedule:
+    # one song per day, indexed by day and by slug, built in a single pass
+    # a day with several songs keeps the first one, like the site does, and gets reported
+    def __init__(self, path: str):
+        self.path = path
+        self.days = {}
+        self.slug_days = {}
+        self.duplicate_days = {}
+        for day, song in iter_schedule_songs(path):
+            if day in self.days:
+                self.duplicate_days.setdefault(day, []).append(song['slug'])
+                continue
+            self.days[day] = song
+            self.slug_days.setdefault(song['slug'], []).append(day)
+        self.sorted_days = sorted(self.days)
+
+    def get_wrap_points(self) -> list:
+        # the days where the schedule starts replaying songs it already had, usually where the loop filler starts
+        wrap_points = []
+        seen_keys = set()
+        is_replaying = False
+        for day in self.sorted_days:
+            song_key = get_song_key(self.days[day])
+            if song_key in seen_keys and not is_replaying:
+                wrap_points.append(day)
+            is_replaying = song_key in seen_keys
+            seen_keys.add(song_key)
+        return wrap_points
+
+    def to_json(self) -> dict:
+        return {
+            'path': self.path,
+            'days': len(self.days),
+            'firstDay': self.sorted_days[0] if self.sorted_days else None,
+            'lastDay': self.sorted_days[-1] if self.sorted_days else None,
+            'songs': len(self.slug_days),
+            'wrapPoints': self.get_wrap_points(),
+            'duplicateDays': [{'day': day, 'slug': self.days[day]['slug'], 'ignoredSlugs': slugs} for day, slugs in sorted(self.duplicate_days.items())],
+        }
+
+def load_motif_rarities(path: str) -> dict:
+    # slug -> rarity from either game_motifs.json or the columnar game_motifs.min.json
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return {motif['slug']: motif['rarity'] for motif in data}
+    return dict(zip(data['columns']['slug'], data['columns']['rarity']))
+
+def get_changed_fields(old_song: dict, new_song: dict) -> list:
+    return sorted(key for key in set(old_song) | set(new_song) if key != 'day' and old_song.get(key) != new_song.get(key))
+
+def diff_schedules(old_schedule: Schedule, new_schedule: Schedule, cutoff_day: str, old_rarities: dict = None, new_rarities: dict = None) -> dict:
+    # every day up to and including cutoff_day counts as played, any other song on one of those is a violation
+    history_violations = []
+    changed_past_details = []
+    changed_days = []
+    for day in sorted(set(old_schedule.days) | set(new_schedule.days)):
+        old_song, new_song = old_schedule.days.get(day), new_schedule.days.get(day)
+        # the compact formats don't repeat the day inside every song, so it can't count as a change
+        if old_song is not None and new_song is not None and not get_changed_fields(old_song, new_song):
+            continue
+        if day <= cutoff_day and old_song is not None:
+            # a different track that happens to share the slug is just as much of a different song
+            if new_song is None or get_song_key(new_song) != get_song_key(old_song):
+                history_violations.append({'day': day, 'oldSlug': old_song['slug'], 'newSlug': new_song['slug'] if new_song else None})
+            else:
+                changed_past_details.append({'day': day, 'slug': old_song['slug'], 'fields': get_changed_fields(old_song, new_song)})
+        else:
+            changed_days.append({
+                'day': day,
+                'oldSlug': old_song['slug'] if old_song else None,
+                'newSlug': new_song['slug'] if new_song else None,
+            })
+
+    report = {
+        'cutoffDay': cutoff_day,
+        'old': old_schedule.to_json(),
+        'new': new_schedule.to_json(),
+        'historyViolations': history_violations,
+        'changedPastDetails': changed_past_details,
+        'changedDays': changed_days,
+        'addedSongs': [{'slug': slug, 'firstDay': days[0]} for slug, days in new_schedule.slug_days.items() if slug not in old_schedule.slug_days],
+        'droppedSongs': [{'slug': slug, 'lastDay': days[-1]} for slug, days in old_schedule.slug_days.items() if slug not in new_schedule.slug_days],
+    }
+    if old_rarities is not None and new_rarities is not None:
+        report['rarityShifts'] = [
+            {'slug': slug, 'oldRarity': old_rarities.get(slug), 'newRarity': new_rarities.get(slug)}
+            for slug in sorted(set(old_rarities) | set(new_rarities)) if old_rarities.get(slug) != new_rarities.get(slug)
+        ]
+    return report
+
+def print_list(title: str, entries: list, format_entry):
+    print(f'{title}: {len(entries)}')
+    for entry in entries[:MAX_LISTED]:
+        print(f'  {format_entry(entry)}')
+    if len(entries) > MAX_LISTED:
+        print(f'  ... and {len(entries) - MAX_LISTED} more')
+
+def print_report(report: dict):
+    for side in ['old', 'new']:
+        schedule = report[side]
+        print(f"{side}: {schedule['path']}, {schedule['days']} days from {schedule['firstDay']} to {schedule['lastDay']}, "
+              f"{schedule['songs']} songs, wraps on {', '.join(schedule['wrapPoints']) or 'no day'}")
+        if schedule['duplicateDays']:
+            print_list(f'{side} days with several songs, keeping the first', schedule['duplicateDays'],
+                       lambda entry: f"{entry['day']}: {entry['slug']} (ignoring {', '.join(entry['ignoredSlugs'])})")
+    print(f"Days up to {report['cutoffDay']} count as played")
+    print_list('History violations', report['historyViolations'], lambda entry: f"{entry['day']}: {entry['oldSlug']} -> {entry['newSlug']}")
+    print_list('Played days with changed details', report['changedPastDetails'], lambda entry: f"{entry['day']}: {entry['slug']} ({', '.join(entry['fields'])})")
+    print_list('Changed upcoming days', report['changedDays'], lambda entry: f"{entry['day']}: {entry['oldSlug']} -> {entry['newSlug']}")
+    print_list('Added songs', report['addedSongs'], lambda entry: f"{entry['slug']} (first on {entry['firstDay']})")
+    print_list('Dropped songs', report['droppedSongs'], lambda entry: f"{entry['slug']} (last on {entry['lastDay']})")
+    if 'rarityShifts' in report:
+        print_list('Rarity shifts', report['rarityShifts'], lambda entry: f"{entry['slug']}: {entry['oldRarity']} -> {entry['newRarity']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff two schedule bakes and fail if an already played day changed')
+    parser.add_argument('old', help='the schedule that is live now')
+    parser.add_argument('new', help='the schedule about to be deployed')
+    parser.add_argument('--today', default=datetime.datetime.now(datetime.timezone.utc).date().isoformat(),
+                        help='the current day in UTC (default: %(default)s)')
+    parser.add_argument('--lock-ahead', type=int, default=LOCK_AHEAD_DAYS,
+                        help='days after --today that also count as played (default: %(default)s)')
+    parser.add_argument('--old-motifs', help='game_motifs.json or game_motifs.min.json of the old bake, to report rarity shifts')
+    parser.add_argument('--new-motifs', help='game_motifs.json or game_motifs.min.json of the new bake, to report rarity shifts')
+    parser.add_argument('--strict', action='store_true',
+                        help='also fail when a played day keeps its song but any of its details (url, leitmotifs...) changed')
+    parser.add_argument('--json', dest='json_output', help='also write the full report to this path')
+    args = parser.parse_args()
+
+    cutoff_day = get_day_string(args.today, args.lock_ahead)
+    report = diff_schedules(
+        Schedule(args.old), Schedule(args.new), cutoff_day,
+        load_motif_rarities(args.old_motifs) if args.old_motifs else None,
+        load_motif_rarities(args.new_motifs) if args.new_motifs else None
+    )
+    print_report(report)
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if report['historyViolations'] or (args.strict and report['changedPastDetails']):
+        print('Played days changed, this bake must not be deployed')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
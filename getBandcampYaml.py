@@ -1,10 +1,118 @@
 # WIP, might never finish because it's a huge pain in the ass
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import yaml
 from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import argparse
+import hashlib
+import html
+import json
+import re
+import os
 import sys
+import threading
+import time
+
+# lxml parses pages several times faster than the built in parser, but we only need it for pages without data-tralbum
+try:
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Album and track pages embed their title, track list, durations and credits as html-escaped json in this attribute
+TRALBUM_ATTRIBUTE = re.compile(r'data-tralbum="([^"]*)"')
+
+# Bandcamp starts answering 429 if we hammer it, so every host gets at most this many requests per second
+REQUESTS_PER_SECOND = 2
+# Track pages fetched at once, they all share the same pooled session
+WORKERS = 8
+RETRIES = 4
+TIMEOUT = 20
+# Answers worth trying again, after waiting for Retry-After or the backoff
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+class HostRateLimiter:
+    # spaces out the requests to every host so they're at least 1 / requests_per_second apart, across all threads
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.lock = threading.Lock()
+        self.next_request_times = {}
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            request_time = max(now, self.next_request_times.get(host, now))
+            self.next_request_times[host] = request_time + self.interval
+        time.sleep(max(0, request_time - now))
+
+def get_cache_file(cache_path, url):
+    return os.path.join(cache_path, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.html')
+
+def get_retry_delay(response, attempt):
+    # whatever Retry-After asks for if it's in seconds, otherwise 1, 2, 4... seconds
+    retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+    return float(retry_after) if retry_after.isdigit() else 2 ** attempt
+
+class HttpFetcher:
+    # fetches pages through one pooled session, with per host rate limits, retries with exponential backoff on
+    # connection errors, 429s and 5xxs, and optionally a cache of every page on disk
+    # anything with the same fetch(url) -> html method can be passed around instead, see FixtureFetcher
+    def __init__(self, requests_per_second=REQUESTS_PER_SECOND, retries=RETRIES, timeout=TIMEOUT, workers=WORKERS, cache_path=None):
+        self.session = requests.Session()
+        # retries happen in fetch rather than in urllib3, so they wait for the rate limiter like any other request
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.retries = retries
+        self.timeout = timeout
+        self.cache_path = cache_path
+        if cache_path:
+            os.makedirs(cache_path, exist_ok=True)
+
+    def fetch(self, url):
+        cache_file = get_cache_file(self.cache_path, url) if self.cache_path else None
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                return f.read()
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait(url)
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                response = None
+            if response is not None and (response.status_code not in RETRY_STATUSES or attempt == self.retries):
+                break
+            time.sleep(get_retry_delay(response, attempt))
+        response.raise_for_status()
+        page_html = response.text
+        if cache_file:
+            # written to a temp file first so a killed run never leaves half a page in the cache
+            with open(f'{cache_file}.tmp', 'w', encoding='utf-8') as f:
+                f.write(page_html)
+            os.replace(f'{cache_file}.tmp', cache_file)
+        return page_html
+
+class FixtureFetcher:
+    # serves pages from saved html files and never touches the network, for working offline
+    # it reads the same layout HttpFetcher caches to, so running once with --cache-dir saves the fixtures
+    def __init__(self, fixtures_path):
+        self.fixtures_path = fixtures_path
+
+    def fetch(self, url):
+        fixture_file = get_cache_file(self.fixtures_path, url)
+        if not os.path.exists(fixture_file):
+            raise FileNotFoundError(f"No fixture for {url} (expected {fixture_file})")
+        with open(fixture_file, 'r', encoding='utf-8') as f:
+            return f.read()
 
 
 def extract_substring(s, keyword, delimiters=['.', '\n']):
@@ -19,18 +127,88 @@ def extract_substring(s, keyword, delimiters=['.', '\n']):
             return substring[:end_idx].replace(keyword, '').strip()
     return substring.replace(keyword, '').strip()
 
-def extract_bandcamp_album_metadata(url):
+def get_tralbum_data(page_html):
+    # pulls the data-tralbum json out of a page with a regex, which is much cheaper than parsing the whole page
+    match = TRALBUM_ATTRIBUTE.search(page_html)
+    if not match:
+        return None
+    try:
+        tralbum = json.loads(html.unescape(match.group(1)))
+    except ValueError:
+        return None
+    # anything without the album or track it describes gets treated like a page without data-tralbum
+    if not isinstance(tralbum, dict) or not isinstance(tralbum.get('current'), dict) or 'title' not in tralbum['current']:
+        return None
+    return tralbum
+
+def get_album_artists(album_desc):
+    album_artists = extract_substring(album_desc, "art by", [',', 'and', '.', '\n']).split()
+    if not album_artists:
+        album_artists = extract_substring(album_desc, "cover by", [',', 'and', '.', '\n']).split()
+    return album_artists
+
+def format_duration(seconds):
+    # same format as the duration shown on track pages
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f'{minutes:02d}:{seconds:02d}'
+
+def get_track_data(track_name, artist, url, duration=None):
+    track_data = {
+        'Track': track_name,
+        'Artists': [artist],
+        'URLs': [url, '-'],
+    }
+    if duration:
+        track_data['Duration'] = duration
+    return track_data
+
+def extract_bandcamp_album_metadata(url, fetcher, workers=WORKERS):
     # get the base URL for the album, which might be https://{GROUP_NAME}.bandcamp.com
     base_url = url.split('/album/')[0]
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    page_html = fetcher.fetch(url)
+    tralbum = get_tralbum_data(page_html)
+    if tralbum is None:
+        return extract_bandcamp_album_metadata_from_html(url, page_html, fetcher, workers)
+
+    album_data = {
+        'Album': tralbum['current']['title'],
+        'Date Added': str(date.today()),
+        'URLs': [url, '-'],
+        'Cover Artists': get_album_artists(tralbum['current'].get('about') or ''),
+        'Color': '#ffffff',
+        'Groups': ['-'],
+    }
+
+    # the album page already has every title and duration, we only need the track page of tracks that don't say
+    # who made them, for the 'music by' in their credits
+    track_infos = [track_info for track_info in tralbum.get('trackinfo') or [] if track_info.get('title_link')]
+    print(f"Found {len(track_infos)} tracks")
+
+    def get_album_track_data(track_info):
+        track_url = base_url + track_info['title_link']
+        if ' - ' not in track_info['title'] and not track_info.get('artist'):
+            return extract_bandcamp_track_metadata(track_url, fetcher)
+        if ' - ' in track_info['title']:
+            artist, track_name = track_info['title'].split(' - ', 1)
+        else:
+            artist, track_name = track_info['artist'], track_info['title']
+        duration = format_duration(track_info['duration']) if track_info.get('duration') else None
+        return get_track_data(track_name, artist, track_url, duration)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tracks_data = [track_data for track_data in executor.map(get_album_track_data, track_infos) if track_data]
+
+    return album_data, tracks_data
+
+def extract_bandcamp_album_metadata_from_html(url, page_html, fetcher, workers=WORKERS):
+    # for album pages without data-tralbum, which means scraping the markup and every single track page
+    base_url = url.split('/album/')[0]
+    soup = BeautifulSoup(page_html, HTML_PARSER)
     
     # Album data
     album_title = soup.select_one('#name-section .trackTitle').text.strip()
     album_desc = soup.select_one('.tralbumData.tralbum-about').text.strip()
-    album_artists = extract_substring(album_desc, "art by", [',', 'and', '.', '\n']).split()
-    if not album_artists:
-        album_artists = extract_substring(album_desc, "cover by", [',', 'and', '.', '\n']).split()
+    album_artists = get_album_artists(album_desc)
     
     track_elements = soup.select('.title')
     print(f"Found {len(track_elements)} track elements")
@@ -45,56 +223,100 @@ def extract_bandcamp_album_metadata(url):
         'Groups': ['-'],
     }
 
-    tracks_data = []
-
-    for track_url in tracks_urls:
-        print(f"Fetching data from {track_url}")
-        track_data = extract_bandcamp_track_metadata(track_url)
-        if track_data:
-            tracks_data.append(track_data)
+    # the track pages are independent, so they're fetched concurrently, but map keeps them in album order
+    print(f"Fetching {len(tracks_urls)} tracks with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tracks_data = [track_data for track_data in executor.map(lambda track_url: extract_bandcamp_track_metadata(track_url, fetcher), tracks_urls)
+                       if track_data]
 
     return album_data, tracks_data
 
-def extract_bandcamp_track_metadata(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
+def extract_bandcamp_track_metadata(url, fetcher):
+    print(f"Fetching data from {url}")
+    page_html = fetcher.fetch(url)
+    tralbum = get_tralbum_data(page_html)
+    if tralbum is not None:
+        track_title = tralbum['current']['title']
+        credits = tralbum['current'].get('credits') or ''
+        track_info = (tralbum.get('trackinfo') or [{}])[0]
+        duration = format_duration(track_info['duration']) if track_info.get('duration') else None
+    else:
+        soup = BeautifulSoup(page_html, HTML_PARSER)
+        track_title = soup.select_one('.trackTitle').text.strip()
+        credits_element = soup.select_one('.tralbumData.tralbum-credits')
+        credits = credits_element.text.strip() if credits_element else ''
+        duration_element = soup.select_one('.time.secondaryText')
+        duration = duration_element.text.strip() if duration_element else None
 
-    track_title = soup.select_one('.trackTitle').text.strip()
-    
     if ' - ' in track_title:
         artist, track_name = track_title.split(' - ', 1)
     else:
         track_name = track_title
-        artist_desc = soup.select_one('.tralbumData.tralbum-credits').text.strip()
-        artist = extract_substring(artist_desc, "music by")
+        artist = extract_substring(credits, "music by")
 
-    track_data = {
-        'Track': track_name,
-        'Artists': [artist],
-        'URLs': [url, '-'],
-    }
+    return get_track_data(track_name, artist, url, duration)
 
-    # Duration and referenced tracks
-    duration_element = soup.select_one('.time.secondaryText')
-    if duration_element:
-        track_data['Duration'] = duration_element.text.strip()
+def write_album_yaml(path, album_data, tracks_data):
+    with open(path, 'w', encoding='utf-8') as outfile:
+        yaml.dump(album_data, outfile, default_flow_style=False, allow_unicode=True)
+        outfile.write("---\n")
+        for track_data in tracks_data:
+            yaml.dump(track_data, outfile, default_flow_style=False, allow_unicode=True)
+            outfile.write("---\n")
 
-    return track_data
+def get_album_yaml_name(url):
+    # https://group.bandcamp.com/album/some-album -> some-album.yaml
+    return urlparse(url).path.rstrip('/').split('/')[-1] + '.yaml'
+
+def read_batch_file(path):
+    # one album URL per line, blank lines and lines starting with # are skipped
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python script_name.py <Bandcamp_album_URL>")
+    parser = argparse.ArgumentParser(description='Scrape Bandcamp albums into hsmusic-data style YAML')
+    parser.add_argument('urls', nargs='*', help='Bandcamp album URLs')
+    parser.add_argument('--batch', help='file with one album URL per line, each album gets its own YAML in --output-dir')
+    parser.add_argument('--output', default='metadata.yaml', help='where a single album gets written (default: %(default)s)')
+    parser.add_argument('--output-dir', default='.', help='where albums get written when there is more than one (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='track pages fetched at once (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND, help='maximum requests per second per host (default: %(default)s)')
+    parser.add_argument('--retries', type=int, default=RETRIES, help='retries for failed requests, with exponential backoff (default: %(default)s)')
+    parser.add_argument('--cache-dir', help='keep every fetched page in this folder and reuse it on later runs')
+    parser.add_argument('--fixtures', help='read pages from a folder saved with --cache-dir instead of the network')
+    args = parser.parse_args()
+
+    urls = args.urls + (read_batch_file(args.batch) if args.batch else [])
+    if not urls:
+        parser.print_usage()
         sys.exit(1)
 
-    url = sys.argv[1]
-    album_data, tracks_data = extract_bandcamp_album_metadata(url)
+    workers = max(1, args.workers)
+    if args.fixtures:
+        fetcher = FixtureFetcher(args.fixtures)
+    else:
+        fetcher = HttpFetcher(requests_per_second=args.rate, retries=args.retries, workers=workers, cache_path=args.cache_dir)
 
-    with open('metadata.yaml', 'w', encoding='utf-8') as outfile:
-        yaml.dump(album_data, outfile, default_flow_style=False, allow_unicode=True)
-        outfile.write("---\n")
-        for track_data in tracks_data:
-            yaml.dump(track_data, outfile, default_flow_style=False, allow_unicode=True)
-            outfile.write("---\n")
+    failed_urls = []
+    for url in urls:
+        try:
+            album_data, tracks_data = extract_bandcamp_album_metadata(url, fetcher, workers)
+        except (requests.RequestException, OSError, AttributeError, KeyError, TypeError) as e:
+            # one broken album shouldn't throw away the rest of the batch
+            print(f"Failed to scrape {url}: {e}")
+            failed_urls.append(url)
+            continue
+        if len(urls) == 1 and not args.batch:
+            output_path = args.output
+        else:
+            os.makedirs(args.output_dir, exist_ok=True)
+            output_path = os.path.join(args.output_dir, get_album_yaml_name(url))
+        write_album_yaml(output_path, album_data, tracks_data)
+        print(f"Wrote {len(tracks_data)} tracks to {output_path}")
+
+    if failed_urls:
+        print(f"Failed to scrape {len(failed_urls)} of {len(urls)} albums")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,61 @@
-# Requires pip install pyyaml if you ever want to rebake this for whatever reason
+# Requires pip install pyyaml numpy scipy if you ever want to rebake this for whatever reason
+# Commit schedule_history.jsonl together with the rebaked files in static/, it is what keeps already played days from changing
 
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple
 import yaml
+import numpy as np
+from scipy import sparse
 import os
 import json
 import re
 import random
 import datetime
-from collections import Counter
+import sys
+import io
+import argparse
+import csv
+import itertools
+import hashlib
+import inspect
+import pickle
+import zlib
+import gzip
+import tempfile
+import shutil
+import filecmp
+import sqlite3
+import subprocess
+import logging
+import time
+import cProfile
+import pstats
+import tracemalloc
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from dataclasses import dataclass, replace
+
+# orjson is optional too, it only makes writing the outputs faster, they come out the same either way
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# brotli is optional, without it we only precompress the outputs with gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger('hsmusicToSongs')
+
+# libyaml's C loader is an order of magnitude faster than the pure-Python one, but it's only
+# there if pyyaml was built against libyaml, so fall back to the slow one otherwise
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 COUNTED_REFERENCE_GROUPS = ['Official Discography', 'group:official']
 
@@ -39,6 +87,14 @@ DISCARDED_MOTIFS = [
     'meet-the-flintstones'
 ]
 
+# Gameplay thresholds: how many songs must reference a motif for it to be common, uncommon or rare,
+# and how many leitmotifs a song needs to be playable. Try new values with --sweep before changing these
+COMMON_LEITMOTIF_THRESHOLD = 20
+UNCOMMON_LEITMOTIF_THRESHOLD = 10
+RARE_LEITMOTIF_THRESHOLD = 4
+MIN_LEITMOTIFS = 3
+MAX_LEITMOTIFS = 999
+
 # This will never change. Since the game has gone live, we must preserve songs between this date and...
 ORIGINAL_DATETIME = datetime.datetime(2023, 8, 9, 0, 0, 0, 0, tzinfo=datetime.timezone.utc)
 
@@ -52,9 +108,208 @@ file_path = os.path.dirname(os.path.realpath(__file__))
 
 OUTPUT_PATH = os.path.join(file_path, 'static/')
 
+# Slugging regexes, compiled once since every track, reference, sample and artist goes through them
+SLUG_INVALID_CHARACTERS = re.compile(r'[^a-zA-Z0-9\-]')
+SLUG_REPEATED_DASHES = re.compile(r'-{2,}')
+SLUG_EDGE_DASHES = re.compile(r'^-+|-+$')
+
+# Popular motifs and prolific artists get slugged thousands of times per run, so we memoize the most recent ones
+SLUG_CACHE_SIZE = 65536
+
+# Per month shards of the schedule, so the site only downloads the months it needs
+SCHEDULE_SHARDS_PATH = os.path.join(OUTPUT_PATH, 'schedule')
+
+# Shards a rebake stopped pointing at stay around this long, for clients still holding a cached manifest.json
+SCHEDULE_SHARD_GRACE_DAYS = 7
+
+# Motif names are indexed by the first characters of each of their words, for the guess autocomplete
+MOTIF_PREFIX_LENGTH = 2
+
+# Extracted album records are cached here between runs, so only albums that changed get parsed again
+CACHE_PATH = os.path.join(file_path, '.cache', 'albums')
+
+# The cache drops its least recently used entries once it grows past this size
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Every bake leaves a SQLite snapshot of the extracted wiki here, which the next bakes (and any ad-hoc
+# analysis) can open instead of reading hsmusic-data at all, for as long as hsmusic-data doesn't change
+SNAPSHOT_PATH = os.path.join(file_path, '.cache', 'hsmusic-data.sqlite')
+
+# Append-only history of every day players could already have played, see ScheduleStore
+# the site never reads it, so it lives outside static/ and never gets deployed, but it has to be committed
+# along with every rebake, otherwise the next one (on another machine or in CI) doesn't know what was played
+SCHEDULE_HISTORY_PATH = os.path.join(file_path, 'schedule_history.jsonl')
+# Days are locked this many days ahead of UTC, since players east of it are already on tomorrow's song
+LOCK_AHEAD_DAYS = 1
+
+# How often --watch looks for changed album files, in seconds
+WATCH_INTERVAL = 0.5
+
+# Every rebake writes its stage timings and counters here, next to the files it baked
+RUN_REPORT_PATH = os.path.join(OUTPUT_PATH, 'run_report.json')
+
+SNAPSHOT_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE albums (album_index INTEGER PRIMARY KEY, album_name, status, n_documents);
+CREATE TABLE tracks (album_index INTEGER, slug, name, album_display_name, is_official, is_fandom, image_url, has_directory);
+CREATE TABLE rereleases (album_index INTEGER, name, directory, original);
+CREATE TABLE songs (song_id INTEGER PRIMARY KEY, album_index INTEGER, slug, name, artists, album_display_name,
+                    wiki_url, image_url, is_official, is_fandom, url, url_type);
+CREATE TABLE song_references (song_id INTEGER, kind, track_name);
+CREATE INDEX tracks_album ON tracks (album_index);
+CREATE INDEX tracks_slug ON tracks (slug);
+CREATE INDEX rereleases_album ON rereleases (album_index);
+CREATE INDEX songs_album ON songs (album_index);
+CREATE INDEX songs_slug ON songs (slug);
+CREATE INDEX song_references_song ON song_references (song_id);
+CREATE INDEX song_references_track ON song_references (track_name);
+"""
+
+# The album records we extract and cache stay plain dicts and lists, so they pickle the same way no matter
+# how this script was started. Once the albums are merged, tracks, songs and guesses use these slotted records
+# instead, with their repeated strings interned, and are only turned back into dicts when writing the json files
+
+class RunReport:
+    # wall time per stage and counters (albums parsed, songs kept, duplicates...) of one rebake
+    # while tracemalloc is tracing, it also keeps the peak memory of every stage
+    def __init__(self):
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.stages = {}
+        self.peaks = {}
+        self.counters = Counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+            if tracemalloc.is_tracing():
+                self.peaks[name] = max(self.peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+            logger.debug('%s took %.3fs', name, self.stages[name])
+
+    def to_json(self) -> dict:
+        report = {
+            'startedAt': self.started_at.isoformat(),
+            'totalSeconds': round(sum(self.stages.values()), 4),
+            'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            'counters': dict(self.counters),
+        }
+        if self.peaks:
+            report['peakBytes'] = self.peaks
+        return report
+
+# The report of the current rebake, get_game_data starts a new one every time it runs
+run_report = RunReport()
+
+@dataclass(slots=True)
+class Track:
+    # a track other songs can reference, the values of slugs_dict
+    name: str
+    album_name: str
+    is_official: bool
+    is_fandom: bool
+    image_url: str
+
+    @classmethod
+    def from_json(cls, track: dict) -> 'Track':
+        return cls(
+            name=track['name'],
+            album_name=sys.intern(track['albumName']),
+            is_official=track['isOfficial'],
+            is_fandom=track['isFandom'],
+            image_url=track['imageUrl']
+        )
+
+@dataclass(slots=True)
+class Song:
+    # a playable song, one entry of game_songs.json
+    slug: str
+    name: str
+    artist: Tuple[str, ...]
+    album_name: str
+    leitmotifs: Tuple[str, ...]
+    # songs baked before samples were tracked don't have them at all
+    samples: Optional[Tuple[str, ...]]
+    n_leitmotifs: int
+    wiki_url: str
+    image_url: str
+    is_official: bool
+    is_fandom: bool
+    url: str
+    url_type: str
+    day: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, song: dict) -> 'Song':
+        return cls(
+            slug=sys.intern(song['slug']),
+            name=song['name'],
+            artist=tuple(sys.intern(artist) for artist in song['artist']),
+            album_name=sys.intern(song['albumName']),
+            leitmotifs=tuple(sys.intern(leitmotif) for leitmotif in song['leitmotifs']),
+            samples=tuple(sys.intern(sample) for sample in song['samples']) if 'samples' in song else None,
+            n_leitmotifs=song['nLeitmotifs'],
+            wiki_url=song['wikiUrl'],
+            image_url=song['imageUrl'],
+            is_official=song['isOfficial'],
+            is_fandom=song['isFandom'],
+            url=song['url'],
+            url_type=song['urlType'],
+            day=song.get('day')
+        )
+
+    def to_json(self) -> dict:
+        song = {
+            'slug': self.slug,
+            'name': self.name,
+            'artist': list(self.artist),
+            'albumName': self.album_name,
+            'leitmotifs': list(self.leitmotifs),
+        }
+        if self.samples is not None:
+            song['samples'] = list(self.samples)
+        song.update({
+            'nLeitmotifs': self.n_leitmotifs,
+            'wikiUrl': self.wiki_url,
+            'imageUrl': self.image_url,
+            'isOfficial': self.is_official,
+            'isFandom': self.is_fandom,
+            'url': self.url,
+            'urlType': self.url_type,
+        })
+        if self.day is not None:
+            song['day'] = self.day
+        return song
+
+@dataclass(slots=True)
+class Guess:
+    # a motif players can guess, one entry of game_motifs.json
+    slug: str
+    name: str
+    album_name: str
+    is_official: bool
+    is_fandom: bool
+    image_url: str
+    rarity: int
+
+    def to_json(self) -> dict:
+        return {
+            'name': self.name,
+            'albumName': self.album_name,
+            'isOfficial': self.is_official,
+            'isFandom': self.is_fandom,
+            'imageUrl': self.image_url,
+            'slug': self.slug,
+            'rarity': self.rarity
+        }
+
 def load_file(path: str) -> List[object]:
     with open(path, 'r', encoding='utf8') as f:
-        subfiles = yaml.load_all(f, Loader=yaml.SafeLoader)
+        subfiles = yaml.load_all(f, Loader=SafeLoader)
 
         objs = []
         for subfile in subfiles:
@@ -62,20 +317,24 @@ def load_file(path: str) -> List[object]:
 
     return objs 
 
+@lru_cache(maxsize=SLUG_CACHE_SIZE)
 def normalize_wiki_string(string: str) -> str:
     # ugh, seems to be the only TWO cases where this matters
     if (string == 'MeGaLoVania'):
         return 'MeGaLoVania'
     elif (string == 'iRRRRRRRRECONCILA8LE'):
         return 'iRRRRRRRRECONCILA8LE'
-    string = re.split(' ', string)
-    string = "-".join(string)
-    string = re.sub('&', 'and', string)
-    string = re.sub('[^a-zA-Z0-9\-]', '', string)
-    string = re.sub('-{2,}', '-', string)
-    string = re.sub('^-+|-+$', '', string).lower()
+    string = string.replace(' ', '-')
+    string = string.replace('&', 'and')
+    string = SLUG_INVALID_CHARACTERS.sub('', string)
+    string = SLUG_REPEATED_DASHES.sub('-', string)
+    string = SLUG_EDGE_DASHES.sub('', string).lower()
     return string
 
+def normalize_wiki_strings(strings: List[str]) -> List[str]:
+    # slugs a whole list of names in one go, sharing normalize_wiki_string's cache
+    return list(map(normalize_wiki_string, strings))
+
 def get_is_official(album_object, song) -> bool:
     song_exceptions = [
         ('penumbra-phantasm', 'Toby Fox')
@@ -88,382 +347,1374 @@ def get_is_official(album_object, song) -> bool:
     return is_album_official or is_song_exception
     
 
-def load_slugs(album_path) -> dict:
-    # iterates over all the songs, and either takes it's 'Directory' field or calculates it
-    # by using normalize_wiki_string, then adds it to a dictionary with 'track:slug' as the key
-    # and the full track name (song['Track']) as the key
-    album_names = [os.path.splitext(album)[0] for album in os.listdir(album_path)
-                if os.path.splitext(album)[1] == '.yaml']
-    
-    print(f'Slugging {len(album_names)} albums...')
+def extract_album_slugs(album_name: str, potential_songs: List[object]) -> List[tuple]:
+    # iterates over all the songs of one album, and either takes it's 'Directory' field or calculates it
+    # by using normalize_wiki_string. returns a list of ('track:slug', song_object, has_directory) entries
+    # in album order, load_slugs decides which of them end up in the final dictionary
+    slug_entries = []
+    album_object = next((album for album in potential_songs if 'Album' in album), None)
+    if album_object is None:
+        return slug_entries
+    album_lacks_art = 'Has Track Art' in album_object and album_object['Has Track Art'] == False
+    for song in potential_songs:
+        if song is None:
+            continue
+        # if it contains the field Originally Released As, skip it
+        if 'Originally Released As' in song:
+            continue
+        if all(x in song for x in ['Track', 'URLs']):
+            song_name = song['Track']
+            song_slug = normalize_wiki_string(song_name)
+            is_official = get_is_official(album_object, song)
+            is_fandom = not is_official and 'Fandom' in album_object['Groups'] if 'Groups' in album_object else False
+            if album_lacks_art or ('Has Cover Art' in song and song['Has Cover Art'] == False):
+                image_url = f'https://hsmusic.wiki/thumb/album-art/{album_name}/cover.small.jpg'
+            else:
+                image_url = f'https://hsmusic.wiki/thumb/album-art/{album_name}/{song_slug}.small.jpg'
+            song_object = {
+                'name': song_name,
+                'albumName': album_object['Album'],
+                'isOfficial': is_official,
+                'isFandom': is_fandom,
+                'imageUrl': image_url,
+            }
+            if 'Directory' in song:
+                slug_entries.append((f'track:{song["Directory"]}', song_object, True))
+            else:
+                slug_entries.append((f'track:{song_slug}', song_object, False))
+    return slug_entries
 
-    slugs_dict = {}
-    for album_name in album_names:
-        potential_songs = load_file(os.path.join(album_path, f"{album_name}.yaml"))
-        album_object = next((album for album in potential_songs if 'Album' in album), None)
-        if album_object is None:
+def extract_album_rereleases(potential_songs: List[object]) -> List[dict]:
+    # tracks with 'Originally Released As' don't get a slug of their own, but other songs can still reference
+    # them by their name or directory, so we keep what they're a rerelease of
+    rereleases = []
+    for song in potential_songs:
+        if song is None or 'Originally Released As' not in song or 'Track' not in song:
             continue
-        album_lacks_art = 'Has Track Art' in album_object and album_object['Has Track Art'] == False
-        for song in potential_songs:
-            if song is None:
-                continue
-            # if it contains the field Originally Released As, skip it
-            if 'Originally Released As' in song:
-                continue
-            if all(x in song for x in ['Track', 'URLs']):
-                song_name = song['Track']
-                song_slug = normalize_wiki_string(song_name)
-                is_official = get_is_official(album_object, song)
-                is_fandom = not is_official and 'Fandom' in album_object['Groups'] if 'Groups' in album_object else False
-                if album_lacks_art or ('Has Cover Art' in song and song['Has Cover Art'] == False):
-                    image_url = f'https://hsmusic.wiki/thumb/album-art/{album_name}/cover.small.jpg'
+        rereleases.append({
+            'name': song['Track'],
+            'directory': song['Directory'] if 'Directory' in song else normalize_wiki_string(song['Track']),
+            'original': song['Originally Released As']
+        })
+    return rereleases
+
+def extract_album_songs(album_name: str, potential_songs: List[object]) -> dict:
+    # extracts every candidate song of one album, without looking at any other album
+    # referenced and sampled tracks are kept as they appear in the wiki, since resolving them
+    # needs the slugs of the whole wiki. get_valid_songs does that when merging the albums
+    if album_name in EXCLUDED_ALBUMS:
+        return {'status': 'excluded', 'songs': []}
+
+    # we only want to include albums that have at least one group in GAME_GROUPS
+    album_object = next((album for album in potential_songs if 'Album' in album), None)
+    if album_object is None:
+        return {'status': 'missing', 'songs': []}
+    album_lacks_art = 'Has Track Art' in album_object and album_object['Has Track Art'] == False
+    groups = album_object['Groups'] if 'Groups' in album_object else []
+    if not any(group in INCLUDED_GROUPS for group in groups) or any(group in EXCLUDED_GROUPS for group in groups):
+        return {'status': 'not_homestuck', 'songs': []}
+
+    readable_album_name = potential_songs[0]['Album']
+    album_artists = potential_songs[0]['Artists'] if 'Artists' in potential_songs[0] else []
+
+    songs = []
+    for song in potential_songs:
+        if song is None:
+            continue
+        # if it contains the field Originally Released As, skip it
+        if 'Originally Released As' in song:
+            continue
+        if all(x in song for x in ['Track', 'URLs']):
+            song_name = song['Track']
+            track_slug_no_prefix = normalize_wiki_string(song_name) if 'Directory' not in song else song['Directory']
+            is_official = get_is_official(album_object, song)
+            is_fandom = not is_official and 'Fandom' in groups
+            # build a new list so we never rewrite the parsed album in place
+            artists = []
+            for artist in (song['Artists'] if 'Artists' in song else album_artists):
+                # if artist doesn't contain artist:, slug it and put it before the artist name
+                if 'artist:' not in artist:
+                    # remove anything between parentheses and then trim the end
+                    normalized_artist = re.sub(r'\([^)]*\)', '', artist).strip()
+                    artist = f"artist:{normalize_wiki_string(normalized_artist)}"
+                artists.append(artist)
+
+            # we fetch the url slug for the wiki URL and the image url
+            wiki_url = f'https://hsmusic.wiki/track/{track_slug_no_prefix}'
+            if album_lacks_art or ('Has Cover Art' in song and song['Has Cover Art'] == False):
+                image_url = f'https://hsmusic.wiki/media/album-art/{album_name}/cover.small.jpg'
+            else:
+                image_url = f'https://hsmusic.wiki/media/album-art/{album_name}/{track_slug_no_prefix}.small.jpg'
+            urls = song['URLs']
+            # urls can contain multiple links, we want to grab the youtube link if it exists (and set urlType to youtube)
+            # otherwise, the soundcloud link (and set urlType to soundcloud). if neither exist, url should be set to None
+            url = None
+            urlType = None
+            for urlString in urls:
+                if not urlString:
+                    logger.warning('Skipping %s because it somehow has a None URL!', song_name)
+                    continue
+                if 'youtu' in urlString:
+                    url = urlString
+                    urlType = 'youtube'
+                    break
+                elif 'soundcloud' in urlString:
+                    url = urlString
+                    urlType = 'soundcloud'
+            songs.append({
+                'slug': track_slug_no_prefix,
+                'name': song_name,
+                'artist': artists,
+                'albumName': readable_album_name,
+                'referencedTracks': song['Referenced Tracks'] if 'Referenced Tracks' in song else [],
+                'sampledTracks': song['Sampled Tracks'] if 'Sampled Tracks' in song else [],
+                'wikiUrl': wiki_url,
+                'imageUrl': image_url,
+                'isOfficial': is_official,
+                'isFandom': is_fandom,
+                'url': url,
+                'urlType': urlType
+            })
+    return {'status': 'included', 'songs': songs, 'n_documents': len(potential_songs)}
+
+def extract_album(album_name: str, album_file: str) -> dict:
+    # parses one album yaml and runs both the slug and the song extraction on it
+    # the result only depends on the file contents, so it's what we store in the parse cache
+    potential_songs = load_file(album_file)
+    return {
+        'album_name': album_name,
+        'slugs': extract_album_slugs(album_name, potential_songs),
+        'rereleases': extract_album_rereleases(potential_songs),
+        **extract_album_songs(album_name, potential_songs)
+    }
+
+def get_extraction_fingerprint() -> str:
+    # anything that changes what extract_album returns for the same file has to end up in here,
+    # otherwise we would happily serve stale records out of the cache
+    hasher = hashlib.sha1()
+    for function in [load_file, normalize_wiki_string, get_is_official, extract_album_slugs, extract_album_rereleases, extract_album_songs, extract_album]:
+        hasher.update(inspect.getsource(function).encode('utf8'))
+    constants = (
+        COUNTED_REFERENCE_GROUPS, INCLUDED_GROUPS, EXCLUDED_GROUPS, EXCLUDED_ALBUMS, SafeLoader.__name__,
+        SLUG_INVALID_CHARACTERS.pattern, SLUG_REPEATED_DASHES.pattern, SLUG_EDGE_DASHES.pattern
+    )
+    hasher.update(repr(constants).encode('utf8'))
+    return hasher.hexdigest()
+
+def get_cache_file(album_name: str, album_file: str, fingerprint: str) -> str:
+    # cache entries are keyed by album name plus a hash of the file contents and the extraction fingerprint
+    hasher = hashlib.sha1(fingerprint.encode('utf8'))
+    hasher.update(album_name.encode('utf8'))
+    with open(album_file, 'rb') as f:
+        hasher.update(f.read())
+    return os.path.join(CACHE_PATH, f'{album_name}.{hasher.hexdigest()}.pickle')
+
+def read_cache_file(cache_file: str):
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            record = pickle.loads(zlib.decompress(f.read()))
+    except Exception as e:
+        logger.warning('Ignoring unreadable cache entry %s: %s', cache_file, e)
+        return None
+    # bump the mtime so pruning evicts the least recently used entries first
+    os.utime(cache_file)
+    return record
+
+def write_cache_file(cache_file: str, record: dict):
+    os.makedirs(CACHE_PATH, exist_ok=True)
+    album_name = os.path.basename(cache_file).rsplit('.', 2)[0]
+    # drop the entries of older versions of this album, they will never be hit again
+    for entry in os.listdir(CACHE_PATH):
+        if entry.rsplit('.', 2)[0] == album_name and os.path.join(CACHE_PATH, entry) != cache_file:
+            os.remove(os.path.join(CACHE_PATH, entry))
+    temp_file = f'{cache_file}.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(zlib.compress(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)))
+    os.replace(temp_file, cache_file)
+
+def prune_cache(cache_max_bytes: int):
+    # deletes the least recently used entries until the cache fits in cache_max_bytes
+    if not os.path.exists(CACHE_PATH):
+        return
+    entries = [os.path.join(CACHE_PATH, entry) for entry in os.listdir(CACHE_PATH)]
+    entries = sorted(entries, key=lambda entry: os.path.getmtime(entry), reverse=True)
+    total_bytes = 0
+    for entry in entries:
+        total_bytes += os.path.getsize(entry)
+        if total_bytes > cache_max_bytes:
+            os.remove(entry)
+
+def iter_album_records(album_path, jobs: int = 1, use_cache: bool = True, cache_max_bytes: int = CACHE_MAX_BYTES) -> Iterator[dict]:
+    # parses and extracts every album yaml exactly once and yields the per album records in directory order,
+    # one at a time, so we never hold the whole wiki in memory. unchanged albums come from the cache
+    # the album_path has a bunch of files in the scheme "album-name.yaml", we get all the names without
+    # the extension
+    album_names = [os.path.splitext(album)[0] for album in os.listdir(album_path)
+                   if os.path.splitext(album)[1] == '.yaml']
+    fingerprint = get_extraction_fingerprint() if use_cache else None
+
+    # every album is independent, so we can spread the parsing over several processes
+    # records are always handed back in directory order, so the albums (and therefore slug precedence
+    # and the shuffle) come out exactly like they would in a serial run. only a few albums per worker
+    # are in flight at once, which keeps memory bounded
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    max_pending = jobs * 4
+    pending = deque()
+    n_parsed = 0
+
+    def resolve_pending():
+        cache_file, record = pending.popleft()
+        if isinstance(record, Future):
+            record = record.result()
+            if use_cache:
+                write_cache_file(cache_file, record)
+        return record
+
+    try:
+        for album_name in album_names:
+            album_file = os.path.join(album_path, f"{album_name}.yaml")
+            cache_file = get_cache_file(album_name, album_file, fingerprint) if use_cache else None
+            record = read_cache_file(cache_file) if use_cache else None
+            if record is None:
+                n_parsed += 1
+                if executor is not None:
+                    record = executor.submit(extract_album, album_name, album_file)
                 else:
-                    image_url = f'https://hsmusic.wiki/thumb/album-art/{album_name}/{song_slug}.small.jpg'
-                song_object = {
-                    'name': song_name,
-                    'albumName': album_object['Album'],
-                    'isOfficial': is_official,
-                    'isFandom': is_fandom,
-                    'imageUrl': image_url,
-                }
-                # only add the song if it doesn't already exist
-                # OR if there's a Directory field
-                if 'Directory' in song:
-                    slugs_dict[f'track:{song["Directory"]}'] = song_object
-                elif f'track:{song_slug}' not in slugs_dict:
-                    slugs_dict[f'track:{song_slug}'] = song_object
-    print(f'Slugged {len(slugs_dict)} songs')
+                    record = extract_album(album_name, album_file)
+                    if use_cache:
+                        write_cache_file(cache_file, record)
+            pending.append((cache_file, record))
+            while len(pending) > max_pending or (pending and executor is None):
+                yield resolve_pending()
+        while pending:
+            yield resolve_pending()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    if use_cache:
+        prune_cache(cache_max_bytes)
+    run_report.counters['albumsParsed'] += n_parsed
+    run_report.counters['albumsFromCache'] += len(album_names) - n_parsed
+    logger.info('Parsed %d albums with %d job(s), %d came from the cache', n_parsed, jobs, len(album_names) - n_parsed)
+
+def spool_album_records(album_records: Iterable[dict], spool) -> Iterator[dict]:
+    # passes the records through untouched while also writing everything but the slugs and rereleases to the spool file
+    # get_valid_songs can't start until every slug is known, so it reads the songs back from the spool
+    # instead of us keeping every album around (or parsing them all again)
+    for album_record in album_records:
+        pickle.dump({key: value for key, value in album_record.items() if key not in ('slugs', 'rereleases')}, spool, protocol=pickle.HIGHEST_PROTOCOL)
+        yield album_record
+
+def collect_album_rereleases(album_records: Iterable[dict], rereleases: List[dict]) -> Iterator[dict]:
+    # passes the records through untouched while gathering their rereleases for the ReferenceIndex
+    for album_record in album_records:
+        rereleases.extend(album_record['rereleases'])
+        yield album_record
+
+def get_data_revision(album_path) -> str:
+    # a digest of the name, size and modification time of every album file, so any pull, checkout or local
+    # edit of hsmusic-data makes older snapshots stale. it only needs a stat per file, not a read
+    hasher = hashlib.sha1()
+    for entry in sorted(os.scandir(album_path), key=lambda entry: entry.name):
+        if os.path.splitext(entry.name)[1] == '.yaml':
+            stat = entry.stat()
+            hasher.update(f'{entry.name}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf8'))
+    return hasher.hexdigest()
+
+def get_git_revision(path) -> Optional[str]:
+    # the commit hsmusic-data is checked out at, only recorded so people poking at the snapshot know what's in it
+    try:
+        return subprocess.run(['git', '-C', path, 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def snapshot_album_records(album_records: Iterable[dict], album_path, snapshot_path: str = SNAPSHOT_PATH) -> Iterator[dict]:
+    # passes the records through untouched while also writing them to a new snapshot
+    # the snapshot only replaces the previous one once every album went through, so it's never half written
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    temp_path = f'{snapshot_path}.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    connection = sqlite3.connect(temp_path)
+    completed = False
+    try:
+        connection.executescript(SNAPSHOT_SCHEMA)
+        for album_index, album_record in enumerate(album_records):
+            connection.execute('INSERT INTO albums VALUES (?, ?, ?, ?)', (
+                album_index, album_record['album_name'], album_record['status'], album_record.get('n_documents')
+            ))
+            connection.executemany('INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+                (album_index, slug, track['name'], track['albumName'], track['isOfficial'], track['isFandom'], track['imageUrl'], has_directory)
+                for slug, track, has_directory in album_record['slugs']
+            ])
+            connection.executemany('INSERT INTO rereleases VALUES (?, ?, ?, ?)', [
+                (album_index, rerelease['name'], rerelease['directory'], rerelease['original'])
+                for rerelease in album_record['rereleases']
+            ])
+            for song in album_record['songs']:
+                song_id = connection.execute('INSERT INTO songs VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                    album_index, song['slug'], song['name'], json.dumps(song['artist']), song['albumName'],
+                    song['wikiUrl'], song['imageUrl'], song['isOfficial'], song['isFandom'], song['url'], song['urlType']
+                )).lastrowid
+                connection.executemany('INSERT INTO song_references VALUES (?, ?, ?)',
+                    [(song_id, 'reference', track_name) for track_name in song['referencedTracks']] +
+                    [(song_id, 'sample', track_name) for track_name in song['sampledTracks']])
+            yield album_record
+        connection.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('dataRevision', get_data_revision(album_path)),
+            ('gitRevision', get_git_revision(os.path.dirname(album_path))),
+            ('fingerprint', get_extraction_fingerprint()),
+            ('schema', hashlib.sha1(SNAPSHOT_SCHEMA.encode('utf8')).hexdigest()),
+            ('createdAt', datetime.datetime.now(datetime.timezone.utc).isoformat()),
+        ])
+        connection.commit()
+        completed = True
+    finally:
+        connection.close()
+        if completed:
+            os.replace(temp_path, snapshot_path)
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
+    logger.info('Wrote snapshot %s', snapshot_path)
+
+def open_snapshot(album_path, snapshot_path: str = SNAPSHOT_PATH) -> Optional[sqlite3.Connection]:
+    # opens the snapshot read only, or returns None if there's none or it doesn't match hsmusic-data anymore
+    if not os.path.exists(snapshot_path):
+        return None
+    connection = sqlite3.connect(f'file:{snapshot_path}?mode=ro', uri=True)
+    try:
+        # let sqlite map the file instead of reading it page by page
+        connection.execute('PRAGMA mmap_size = 268435456')
+        meta = dict(connection.execute('SELECT key, value FROM meta'))
+    except sqlite3.DatabaseError as e:
+        # not a database anymore, or one from before the meta table, either way it gets rebuilt
+        logger.warning('Snapshot %s is unreadable, ignoring it: %s', snapshot_path, e)
+        connection.close()
+        return None
+    if (meta.get('dataRevision') != get_data_revision(album_path) or meta.get('fingerprint') != get_extraction_fingerprint()
+            or meta.get('schema') != hashlib.sha1(SNAPSHOT_SCHEMA.encode('utf8')).hexdigest()):
+        logger.info('Snapshot %s is stale, ignoring it', snapshot_path)
+        connection.close()
+        return None
+    return connection
+
+def iter_snapshot_album_records(connection: sqlite3.Connection) -> Iterator[dict]:
+    # rebuilds the same album records iter_album_records yields, in the same order, straight from a snapshot
+    logger.info('Reading albums from the snapshot...')
+    albums = connection.execute('SELECT album_index, album_name, status, n_documents FROM albums ORDER BY album_index').fetchall()
+    run_report.counters['albumsFromSnapshot'] += len(albums)
+    for album_index, album_name, status, n_documents in albums:
+        album_record = {
+            'album_name': album_name,
+            'slugs': [
+                (slug, {'name': name, 'albumName': album_display_name, 'isOfficial': bool(is_official), 'isFandom': bool(is_fandom), 'imageUrl': image_url}, bool(has_directory))
+                for slug, name, album_display_name, is_official, is_fandom, image_url, has_directory in connection.execute(
+                    'SELECT slug, name, album_display_name, is_official, is_fandom, image_url, has_directory FROM tracks WHERE album_index = ? ORDER BY rowid',
+                    (album_index,))
+            ],
+            'rereleases': [
+                {'name': name, 'directory': directory, 'original': original}
+                for name, directory, original in connection.execute(
+                    'SELECT name, directory, original FROM rereleases WHERE album_index = ? ORDER BY rowid', (album_index,))
+            ],
+            'status': status,
+            'songs': [],
+        }
+        if n_documents is not None:
+            album_record['n_documents'] = n_documents
+        song_references = defaultdict(lambda: {'reference': [], 'sample': []})
+        for song_id, kind, track_name in connection.execute(
+                'SELECT song_references.song_id, kind, track_name FROM song_references JOIN songs USING (song_id) '
+                'WHERE songs.album_index = ? ORDER BY song_references.rowid', (album_index,)):
+            song_references[song_id][kind].append(track_name)
+        for song_id, slug, name, artists, album_display_name, wiki_url, image_url, is_official, is_fandom, url, url_type in connection.execute(
+                'SELECT song_id, slug, name, artists, album_display_name, wiki_url, image_url, is_official, is_fandom, url, url_type '
+                'FROM songs WHERE album_index = ? ORDER BY song_id', (album_index,)):
+            album_record['songs'].append({
+                'slug': slug,
+                'name': name,
+                'artist': json.loads(artists),
+                'albumName': album_display_name,
+                'referencedTracks': song_references[song_id]['reference'],
+                'sampledTracks': song_references[song_id]['sample'],
+                'wikiUrl': wiki_url,
+                'imageUrl': image_url,
+                'isOfficial': bool(is_official),
+                'isFandom': bool(is_fandom),
+                'url': url,
+                'urlType': url_type
+            })
+        yield album_record
+
+def iter_spooled_album_records(spool) -> Iterator[dict]:
+    spool.seek(0)
+    while True:
+        try:
+            yield pickle.load(spool)
+        except EOFError:
+            return
+
+def load_slugs(album_records: Iterable[dict]) -> dict:
+    # merges the slugs of every album into a dictionary with 'track:slug' as the key
+    # and the song metadata (song['Track'] as 'name', album, image...) as the value
+    logger.info('Slugging albums...')
+
+    slugs_dict = {}
+    for album_record in album_records:
+        for slug, song_object, has_directory in album_record['slugs']:
+            # only add the song if it doesn't already exist
+            # OR if there's a Directory field
+            if has_directory or slug not in slugs_dict:
+                slugs_dict[sys.intern(slug)] = Track.from_json(song_object)
+    logger.info('Slugged %d songs', len(slugs_dict))
     return slugs_dict
 
-def get_valid_songs(slugs_dict: dict, album_path) -> List[object]:
-    valid_songs = []
-    official_slugs = []
-    leitmotif_counter = Counter()
+class ReferenceIndex:
+    # every way the wiki refers to a track (its 'track:directory' slug, its name, or the name and directory
+    # of one of its rereleases) mapped to the canonical 'track:slug' in slugs_dict, built once per rebake
+    # it also keeps the reference and sample edges between songs, for anything that wants to walk the motif graph
+    def __init__(self, slugs_dict: dict, rereleases: Iterable[dict] = ()):
+        self.slugs_dict = slugs_dict
+        self.aliases = {slug: slug for slug in slugs_dict}
+        for slug, track in slugs_dict.items():
+            # when several tracks share a name, the one slugged after the name itself wins,
+            # which is what references by name always resolved to
+            name_slug = f"track:{normalize_wiki_string(track.name)}"
+            self.aliases.setdefault(track.name, name_slug if name_slug in slugs_dict else slug)
+        for rerelease in rereleases:
+            original_slug = self.resolve(rerelease['original'])
+            if original_slug not in slugs_dict:
+                continue
+            self.aliases.setdefault(f"track:{rerelease['directory']}", original_slug)
+            self.aliases.setdefault(rerelease['name'], original_slug)
 
-    # the file_path has a bunch of files in the scheme "album-name.yaml", we get all the names without
-    # the extension
+        self.references = {}
+        self.samples = {}
+        self.referenced_by = defaultdict(list)
+        self.sampled_by = defaultdict(list)
 
-    album_names = [os.path.splitext(album)[0] for album in os.listdir(album_path) 
-                   if os.path.splitext(album)[1] == '.yaml']
+    def resolve(self, track_name: str) -> str:
+        # anything we don't know about gets slugged like the wiki would
+        slug = self.aliases.get(track_name)
+        if slug is None:
+            slug = f"track:{normalize_wiki_string(track_name)}"
+        return slug
 
-    for album_name in album_names:
-        print(f'Loading {album_name}...')
-        if album_name in EXCLUDED_ALBUMS:
-            print(f'Skipping {album_name} because it is excluded')
-            continue
+    def resolve_all(self, track_names: List[str]) -> Tuple[str, ...]:
+        # same as resolve for every name, with the unknown ones slugged together in one go
+        slugs = [self.aliases.get(track_name) for track_name in track_names]
+        unknown_names = [track_name for track_name, slug in zip(track_names, slugs) if slug is None]
+        if unknown_names:
+            unknown_slugs = iter(normalize_wiki_strings(unknown_names))
+            slugs = [slug if slug is not None else f"track:{next(unknown_slugs)}" for slug in slugs]
+        return tuple(sys.intern(slug) for slug in slugs)
+
+    def add_edges(self, slug: str, leitmotifs: Iterable[str], samples: Iterable[str]):
+        self.references[slug] = tuple(leitmotifs)
+        self.samples[slug] = tuple(samples)
+        for leitmotif in self.references[slug]:
+            self.referenced_by[leitmotif].append(slug)
+        for sample in self.samples[slug]:
+            self.sampled_by[sample].append(slug)
 
-        potential_songs = load_file(os.path.join(album_path, f"{album_name}.yaml"))
-        
-        # we only want to include albums that have at least one group in GAME_GROUPS
-        album_object = next((album for album in potential_songs if 'Album' in album), None)
-        if album_object is None:
+def iter_album_songs(reference_index: ReferenceIndex, album_records: Iterable[dict], leitmotif_counter: Counter, official_slugs: List[str]) -> Iterator[Song]:
+    # streams the songs of every included album with their references resolved through the reference index
+    # the leitmotif counter and the official slugs get updated as we go, since every candidate song counts
+    # for them, even the ones without a playable URL
+    for album_record in album_records:
+        album_name = album_record['album_name']
+        logger.debug('Loading %s...', album_name)
+        if album_record['status'] == 'excluded':
+            run_report.counters['albumsExcluded'] += 1
+            logger.debug('Skipping %s because it is excluded', album_name)
             continue
-        album_lacks_art = 'Has Track Art' in album_object and album_object['Has Track Art'] == False
-        groups = album_object['Groups'] if 'Groups' in album_object else []
-        if not any(group in INCLUDED_GROUPS for group in groups) or any(group in EXCLUDED_GROUPS for group in groups):
-            print(f'Skipping {album_name} because it is not a Homestuck album')
+        if album_record['status'] == 'missing':
+            run_report.counters['albumsMissing'] += 1
+            continue
+        if album_record['status'] == 'not_homestuck':
+            run_report.counters['albumsNotHomestuck'] += 1
+            logger.debug('Skipping %s because it is not a Homestuck album', album_name)
             continue
-        
-        print(f'Loaded {len(potential_songs) - 1} songs from {album_name}')
-        readable_album_name = potential_songs[0]['Album']
 
-        for song in potential_songs:
-            if song is None:
-                continue
-            # if it contains the field Originally Released As, skip it
-            if 'Originally Released As' in song:
-                continue
-            if all(x in song for x in ['Track', 'URLs']):
-                # print(f'Found song {song["Track"]} from {readable_album_name}')
-                song_name = song['Track']
-                track_slug_no_prefix = normalize_wiki_string(song_name) if 'Directory' not in song else song['Directory']
-                track_slug = f"track:{track_slug_no_prefix}"
-                is_official = get_is_official(album_object, song)
-                is_fandom = not is_official and 'Fandom' in groups
-                if is_official:
-                    official_slugs.append(track_slug)
-                album_artists = potential_songs[0]['Artists'] if 'Artists' in potential_songs[0] else []
-                artists = song['Artists'] if 'Artists' in song else album_artists
-                for artist in artists:
-                    # if artist doesn't contain artist:, slug it and put it before the artist name
-                    if 'artist:' not in artist:
-                        # remove anything between parentheses and then trim the end
-                        normalized_artist = re.sub(r'\([^)]*\)', '', artist).strip()
-                        artist_slug = f"artist:{normalize_wiki_string(normalized_artist)}"
-                        artist_index = artists.index(artist)
-                        artists[artist_index] = artist_slug
-
-                referenced_tracks = song['Referenced Tracks'] if 'Referenced Tracks' in song else []
-                sampled_tracks = song['Sampled Tracks'] if 'Sampled Tracks' in song else []
-                leitmotifs = []
-                samples = []
-                for referenced_track in referenced_tracks:
-                    if referenced_track in slugs_dict:
-                        leitmotif_slug = referenced_track
-                    else:
-                        leitmotif_slug = f"track:{normalize_wiki_string(referenced_track)}"
-                    leitmotif_counter[leitmotif_slug] += 1
-                    leitmotifs.append(leitmotif_slug)
-                # samples
-                for sample in sampled_tracks:
-                    if sample in slugs_dict:
-                        sample_slug = sample
-                    else:
-                        sample_slug = f"track:{normalize_wiki_string(sample)}"
-                    samples.append(sample_slug)
-                # we fetch the url slug for the wiki URL and the image url
-                wiki_url = f'https://hsmusic.wiki/track/{track_slug_no_prefix}'
-                if album_lacks_art or ('Has Cover Art' in song and song['Has Cover Art'] == False):
-                    image_url = f'https://hsmusic.wiki/media/album-art/{album_name}/cover.small.jpg'
-                else:
-                    image_url = f'https://hsmusic.wiki/media/album-art/{album_name}/{track_slug_no_prefix}.small.jpg'
-                urls = song['URLs']
-                # urls can contain multiple links, we want to grab the youtube link if it exists (and set urlType to youtube)
-                # otherwise, the soundcloud link (and set urlType to soundcloud). if neither exist, url should be set to None
-                url = None
-                urlType = None
-                for urlString in urls:
-                    if not urlString:
-                        print(f'WARNING: Skipping {song_name} because it somehow has a None URL!')
-                        continue
-                    if 'youtu' in urlString:
-                        url = urlString
-                        urlType = 'youtube'
-                        break
-                    elif 'soundcloud' in urlString:
-                        url = urlString
-                        urlType = 'soundcloud'
-                if url is not None and track_slug_no_prefix not in EXCLUDED_SONGS:
-                    heardle_song = {
-                        'slug': track_slug_no_prefix,
-                        'name': song_name,
-                        'artist': artists,  
-                        'albumName': readable_album_name,
-                        'leitmotifs': leitmotifs,
-                        'samples': samples,
-                        'nLeitmotifs': len(leitmotifs),
-                        'wikiUrl': wiki_url,
-                        'imageUrl': image_url,
-                        'isOfficial': is_official,
-                        'isFandom': is_fandom,
-                        'url': url,
-                        'urlType': urlType
-                    }
-                    if (artists, song_name) not in [(song['artist'], song['name']) for song in valid_songs]:
-                        valid_songs.append(heardle_song)
-                    else:
-                        print(f'Skipping {song_name} because it is a duplicate')
-                else:
-                    print(f'Skipping {song_name} because it has no URL')
-    print(f"{len(valid_songs)} songs added")
+        run_report.counters['albumsIncluded'] += 1
+        run_report.counters['songsExtracted'] += len(album_record['songs'])
+        logger.debug('Loaded %d songs from %s', album_record['n_documents'] - 1, album_name)
+
+        for song in album_record['songs']:
+            song_name = song['name']
+            track_slug_no_prefix = song['slug']
+            if song['isOfficial']:
+                official_slugs.append(f"track:{track_slug_no_prefix}")
+
+            leitmotifs = reference_index.resolve_all(song['referencedTracks'])
+            leitmotif_counter.update(leitmotifs)
+            # samples
+            samples = reference_index.resolve_all(song['sampledTracks'])
+            reference_index.add_edges(f"track:{track_slug_no_prefix}", leitmotifs, samples)
+            if song['url'] is not None and track_slug_no_prefix not in EXCLUDED_SONGS:
+                yield Song(
+                    slug=sys.intern(track_slug_no_prefix),
+                    name=song_name,
+                    artist=tuple(sys.intern(artist) for artist in song['artist']),
+                    album_name=sys.intern(song['albumName']),
+                    leitmotifs=leitmotifs,
+                    samples=samples,
+                    n_leitmotifs=len(leitmotifs),
+                    wiki_url=song['wikiUrl'],
+                    image_url=song['imageUrl'],
+                    is_official=song['isOfficial'],
+                    is_fandom=song['isFandom'],
+                    url=song['url'],
+                    url_type=song['urlType']
+                )
+            elif track_slug_no_prefix in EXCLUDED_SONGS:
+                run_report.counters['songsExcluded'] += 1
+                logger.debug('Skipping %s because it is excluded', song_name)
+            else:
+                run_report.counters['songsMissingUrl'] += 1
+                logger.debug('Skipping %s because it has no URL', song_name)
+
+def get_valid_songs(reference_index: ReferenceIndex, album_records: Iterable[dict]) -> Tuple[List[Song], Counter, List[str]]:
+    valid_songs = []
+    # (artists, name) of every song in valid_songs, so duplicate checks don't scan the whole list
+    valid_song_keys = set()
+    official_slugs = []
+    leitmotif_counter = Counter()
+
+    for heardle_song in iter_album_songs(reference_index, album_records, leitmotif_counter, official_slugs):
+        song_key = (heardle_song.artist, heardle_song.name)
+        if song_key not in valid_song_keys:
+            valid_song_keys.add(song_key)
+            valid_songs.append(heardle_song)
+        else:
+            run_report.counters['songsDuplicate'] += 1
+            logger.debug('Skipping %s because it is a duplicate', heardle_song.name)
+    run_report.counters['songsValid'] += len(valid_songs)
+    logger.info('%d songs added', len(valid_songs))
     random.Random(612).shuffle(valid_songs)
 
+    # ugly exception, we need to manually add unreleased famous songs to official_slugs
+    official_slugs.append('track:penumbra-phantasm')
+    official_slugs.append('track:double-midnight')
+
     return valid_songs, leitmotif_counter, official_slugs
 
-def get_guesses_array(slugs_dict, leitmotif_counter: Counter, common_leitmotif_threshold: int, uncommon_leitmotif_threshold: int, rare_leitmotif_threshold: int):
-    # adds metadata to the slugs_dict to convert it into a guesses array
+def get_rarity_tiers(counts: np.ndarray, is_official: np.ndarray, common_leitmotif_threshold: int, uncommon_leitmotif_threshold: int, rare_leitmotif_threshold: int) -> np.ndarray:
+    # bins how many songs reference each motif into rarity tiers, 5 being the most commonly referenced
+    # motifs referenced only once are always the rarest, and unofficial ones are one tier rarer
+    rarities = np.select(
+        [counts == 1, counts >= common_leitmotif_threshold, counts >= uncommon_leitmotif_threshold, counts >= rare_leitmotif_threshold],
+        [1, 5, 4, 3],
+        default=2
+    )
+    rarities = np.where(is_official, rarities, rarities - 1)
+    return np.maximum(rarities, 1)
+
+def get_guesses_array(slugs_dict, leitmotif_counter: Counter, common_leitmotif_threshold: int, uncommon_leitmotif_threshold: int, rare_leitmotif_threshold: int) -> List[Guess]:
+    # adds metadata to the tracks in slugs_dict to convert them into a guesses array
     # this allows us to calculate if a leitmotif is common, uncommon, or rare
     # and create a final "guesses array" with it that we can use in the game as "valid guesses"
-    guesses_array = []
-    for slug, song in slugs_dict.items():
-        if slug in leitmotif_counter:
-            count = leitmotif_counter[slug]
-            song['slug'] = slug
-            if count == 1:
-                song['rarity'] = 1
-            elif count >= common_leitmotif_threshold:
-                song['rarity'] = 5
-            elif count >= uncommon_leitmotif_threshold:
-                song['rarity'] = 4
-            elif count >= rare_leitmotif_threshold:
-                song['rarity'] = 3
-            elif count < rare_leitmotif_threshold:
-                song['rarity'] = 2
-            if not song['isOfficial']:
-                song['rarity'] -= 1
-            if song['rarity'] < 1:
-                song['rarity'] = 1
-            guesses_array.append(song)
-    return guesses_array
-
-
-def filter_songs(songs: list, old_game_songs: list, leitmotif_counter: Counter, official_slugs: list, 
+    guessed_tracks = [(slug, track) for slug, track in slugs_dict.items() if slug in leitmotif_counter]
+    counts = np.array([leitmotif_counter[slug] for slug, _ in guessed_tracks], dtype=np.int64)
+    is_official = np.array([track.is_official for _, track in guessed_tracks], dtype=bool)
+    rarities = get_rarity_tiers(counts, is_official, common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold)
+    return [
+        Guess(
+            slug=slug,
+            name=track.name,
+            album_name=track.album_name,
+            is_official=track.is_official,
+            is_fandom=track.is_fandom,
+            image_url=track.image_url,
+            rarity=int(rarity)
+        )
+        for (slug, track), rarity in zip(guessed_tracks, rarities)
+    ]
+
+class MotifMatrix:
+    # sparse songs x motifs incidence matrix, built once per bake
+    # every gameplay threshold is evaluated against it with a handful of array operations, so trying
+    # different thresholds doesn't need the songs to be ingested again
+    def __init__(self, songs: List[Song], leitmotif_counter: Counter, official_slugs: Iterable[str]):
+        official_slugs = set(official_slugs)
+        discarded_slugs = set(f"track:{discarded_motif}" for discarded_motif in DISCARDED_MOTIFS)
+        self.songs = songs
+        self.motif_slugs = list(leitmotif_counter)
+        self.motif_indexes = {slug: index for index, slug in enumerate(self.motif_slugs)}
+        self.counts = np.array([leitmotif_counter[slug] for slug in self.motif_slugs], dtype=np.int64)
+        self.is_official = np.array([slug in official_slugs for slug in self.motif_slugs], dtype=bool)
+        self.is_discarded = np.array([slug in discarded_slugs for slug in self.motif_slugs], dtype=bool)
+        self.n_leitmotifs = np.array([song.n_leitmotifs for song in songs], dtype=np.int64)
+
+        # every motif a song references counts once, no matter how often it's listed
+        rows = []
+        columns = []
+        for song_index, song in enumerate(songs):
+            for leitmotif in dict.fromkeys(song.leitmotifs):
+                rows.append(song_index)
+                columns.append(self.motif_indexes[leitmotif])
+        self.incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, columns)),
+            shape=(len(songs), len(self.motif_slugs))
+        )
+
+    def get_motif_sets(self, common_leitmotif_threshold: int, uncommon_leitmotif_threshold: int, rare_leitmotif_threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+        # masks over motif_slugs for the common leitmotifs, and for the official ones that are frequent enough to guess
+        common_leitmotifs = self.counts >= common_leitmotif_threshold
+        guessable_leitmotifs = common_leitmotifs | (self.counts >= uncommon_leitmotif_threshold) | (self.counts >= rare_leitmotif_threshold)
+        official_leitmotifs = guessable_leitmotifs & self.is_official & (self.counts >= rare_leitmotif_threshold)
+        return common_leitmotifs, official_leitmotifs
+
+    def get_playable_mask(self, common_leitmotif_threshold: int, uncommon_leitmotif_threshold: int, rare_leitmotif_threshold: int,
+                          min_leitmotifs: int, max_leitmotifs: int, excluded_slugs: Iterable[str] = ()) -> np.ndarray:
+        # mask over songs of the ones that are fun to play with these thresholds
+        common_leitmotifs, official_leitmotifs = self.get_motif_sets(common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold)
+        # meme leitmotifs like the-nutshack-intro don't count towards the minimum
+        n_counted_leitmotifs = self.incidence @ (~self.is_discarded).astype(np.int64)
+        n_official_songs = self.incidence @ official_leitmotifs.astype(np.int64)
+        n_common_unofficial_songs = self.incidence @ (common_leitmotifs & ~official_leitmotifs).astype(np.int64)
+        excluded_slugs = set(excluded_slugs)
+        is_excluded = np.array([song.slug in excluded_slugs for song in self.songs], dtype=bool)
+        # for fun gameplay, we want to make sure that there are either official or very well known leitmotifs in the song
+        # let's account for these cases:
+        # two or more official songs
+        # one official song and two or more common songs
+        return (
+            ~is_excluded
+            & (n_counted_leitmotifs >= min_leitmotifs)
+            & (self.n_leitmotifs <= max_leitmotifs)
+            & ((n_official_songs >= 2) | ((n_official_songs >= 1) & (n_common_unofficial_songs >= 2)))
+        )
+
+
+def filter_songs(songs: List[Song], old_game_songs: List[Song], leitmotif_counter: Counter, official_slugs: list, 
                  common_leitmotif_threshold: int, uncommon_leitmotif_threshold: int, rare_leitmotif_threshold: int, 
-                 min_leitmotifs: int, max_leitmotifs: int):
+                 min_leitmotifs: int, max_leitmotifs: int, motif_matrix: Optional[MotifMatrix] = None,
+                 start_datetime: datetime.datetime = START_DATETIME) -> List[Song]:
     # takes the full songs json and filters based on chosen gameplay parameters
-    filtered_songs = []
-    common_leitmotifs = set()
-    uncommon_leitmotifs = set()
-    rare_leitmotifs = set()
-
-    # copy leitmotif_counter so we don't modify the original
-    official_counter = leitmotif_counter.copy()
-    # filter out leitmotifs that aren't official or are too rare
-    for leitmotif, count in leitmotif_counter.items():
-        if leitmotif not in official_slugs or count < rare_leitmotif_threshold:
-            if leitmotif in official_counter:
-                del official_counter[leitmotif]
-    
-    # filter out leitmotifs that appear less than min_leitmotif_counter times
-    print(f'Filtering leitmotifs with thresholds {common_leitmotif_threshold}, {uncommon_leitmotif_threshold}, {rare_leitmotif_threshold}...')
-    for leitmotif, count in leitmotif_counter.items():
-        if count >= common_leitmotif_threshold:
-            common_leitmotifs.add(leitmotif)
-        elif count >= uncommon_leitmotif_threshold:
-            uncommon_leitmotifs.add(leitmotif)
-        elif count >= rare_leitmotif_threshold:
-            rare_leitmotifs.add(leitmotif)
-
-    # add all sets into guessable_leitmotifs
-    guessable_leitmotifs = common_leitmotifs.union(uncommon_leitmotifs).union(rare_leitmotifs)
-    # with official_counter we can filter guessable_leitmotifs into official_leitmotifs
-    official_leitmotifs = set()
-    for leitmotif in guessable_leitmotifs:
-        if leitmotif in official_counter:
-            official_leitmotifs.add(leitmotif)
-            
-
-    # filter out songs that have less than min_leitmotifs leitmotifs
-    print(f'Filtering out songs that have less than {min_leitmotifs} leitmotifs or more than {max_leitmotifs}...')
-    for song in songs:
-        if song['slug'] in [song['slug'] for song in old_game_songs]:
-            continue
-        set_song_leitmotifs = set(song['leitmotifs'])
-        for discarded_motif in DISCARDED_MOTIFS:
-                set_song_leitmotifs.discard(f"track:{discarded_motif}")
-        if len(set_song_leitmotifs) >= min_leitmotifs and song['nLeitmotifs'] <= max_leitmotifs:
-            set_song_leitmotifs = set(song['leitmotifs'])
-            # remove meme leitmotifs that shouldn't count
-            # for example, the-nutshack-theme
-            n_official_songs = len(set_song_leitmotifs.intersection(official_leitmotifs))
-            n_common_unofficial_songs = len(set_song_leitmotifs.intersection(common_leitmotifs).difference(official_leitmotifs))
-            # for fun gameplay, we want to make sure that there are either official or very well known leitmotifs in the song
-            # let's account for these cases:
-            # two or more official songs
-            # one official song and two or more common songs
-            if n_official_songs >= 2 or (n_official_songs >= 1 and n_common_unofficial_songs >= 2):
-                filtered_songs.append(song)
-
-    # add starting date
-    day = START_DATETIME
-    for song in filtered_songs:
+    # pass a motif_matrix built from the same songs to skip building it again
+    if motif_matrix is None:
+        motif_matrix = MotifMatrix(songs, leitmotif_counter, official_slugs)
+
+    logger.info('Filtering leitmotifs with thresholds %d, %d, %d...', common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold)
+    logger.info('Filtering out songs that have less than %d leitmotifs or more than %d...', min_leitmotifs, max_leitmotifs)
+    playable_mask = motif_matrix.get_playable_mask(
+        common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold,
+        min_leitmotifs, max_leitmotifs,
+        excluded_slugs=(song.slug for song in old_game_songs)
+    )
+    filtered_songs = [song for song, is_playable in zip(songs, playable_mask) if is_playable]
+
+    # add starting date, to copies so the songs we were given stay untouched
+    day = start_datetime
+    for index, song in enumerate(filtered_songs):
         # we store the date in a string format readable by javascript
-        song['day'] = day.strftime('%Y-%m-%d')
+        filtered_songs[index] = replace(song, day=day.strftime('%Y-%m-%d'))
         day += datetime.timedelta(days=1)
     return filtered_songs
 
-def get_game_data(store: bool = True) -> List[object]:
-    file_path = os.path.dirname(os.path.realpath(__file__))
-    hsmusic_data_path = os.path.join(file_path, 'hsmusic-data')
-    album_path = os.path.join(hsmusic_data_path, 'album')
-    
-    slugs_dict = load_slugs(album_path)
+def get_next_day(day: str) -> str:
+    return (datetime.datetime.strptime(day, '%Y-%m-%d') + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+
+class ScheduleStore:
+    # append-only record of every day that's locked, one song json per line in day order
+    # a day gets locked once players could have played it, and from then on rebakes only ever append new
+    # days after the last locked one, they never rewrite or re-validate the locked ones
+    # lock() only locks days in memory, nothing touches the file until save()
+    def __init__(self, path: str = SCHEDULE_HISTORY_PATH):
+        self.path = path
+        self.songs = []
+        self.unsaved_songs = []
+        # how much of the file is complete lines, save() appends after that
+        self.complete_length = 0
+        self.has_partial_line = False
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, 'rb') as f:
+            contents = f.read()
+        self.complete_length = contents.rfind(b'\n') + 1
+        self.has_partial_line = self.complete_length < len(contents)
+        if self.has_partial_line:
+            # a rebake died in the middle of an append, that day never got locked
+            logger.warning('Ignoring a half written line at the end of %s', self.path)
+        for line in contents[:self.complete_length].splitlines():
+            if not line.strip():
+                continue
+            song = Song.from_json(json.loads(line))
+            if self.songs and song.day != get_next_day(self.songs[-1].day):
+                raise ValueError(f'{self.path} jumps from {self.songs[-1].day} to {song.day}')
+            self.songs.append(song)
+
+    def get_last_day(self) -> Optional[str]:
+        return self.songs[-1].day if self.songs else None
+
+    def lock(self, game_songs: Iterable[Song], until_day: str) -> int:
+        # locks the songs of the days right after the last locked one, up to and including until_day
+        # game_songs has to be in day order, days that are already locked are skipped and a gap stops it
+        next_day = get_next_day(self.songs[-1].day) if self.songs else None
+        locked_songs = []
+        for song in game_songs:
+            if song.day > until_day:
+                break
+            if next_day is not None and song.day < next_day:
+                continue
+            if next_day is not None and song.day != next_day:
+                break
+            locked_songs.append(song)
+            next_day = get_next_day(song.day)
+        self.songs.extend(locked_songs)
+        self.unsaved_songs.extend(locked_songs)
+        return len(locked_songs)
+
+    def save(self):
+        # appends every day locked since the last save, over any half written line a crash left behind
+        if not self.unsaved_songs and not self.has_partial_line:
+            return
+        with open(self.path, 'ab') as f:
+            f.truncate(self.complete_length)
+            f.write(b''.join(dumps_json(song.to_json()) + b'\n' for song in self.unsaved_songs))
+            f.flush()
+            os.fsync(f.fileno())
+            self.complete_length = f.tell()
+        self.unsaved_songs = []
+        self.has_partial_line = False
+
+def get_game_schedule(game_songs: List[object]) -> dict:
+    # turns the looped, one entry per day game_songs list into a deduplicated song table plus a
+    # day -> song index schedule, so the front end doesn't download the same song dozens of times
+    # schedule[n] is the index of the song for firstDay + n days, or -1 if that day has no song
+    songs = []
+    song_indexes = {}
+    day_indexes = {}
+    for song in game_songs:
+        base_song = {key: value for key, value in song.items() if key != 'day'}
+        song_key = json.dumps(base_song, sort_keys=True)
+        if song_key not in song_indexes:
+            song_indexes[song_key] = len(songs)
+            songs.append(base_song)
+        # the front end always picked the first song it found for a day, so keep doing that
+        if song['day'] not in day_indexes:
+            day_indexes[song['day']] = song_indexes[song_key]
+
+    schedule = []
+    if day_indexes:
+        first_day = datetime.datetime.strptime(min(day_indexes), '%Y-%m-%d')
+        last_day = datetime.datetime.strptime(max(day_indexes), '%Y-%m-%d')
+        day = first_day
+        while day <= last_day:
+            schedule.append(day_indexes.get(day.strftime('%Y-%m-%d'), -1))
+            day += datetime.timedelta(days=1)
+
+    return {
+        'firstDay': min(day_indexes) if day_indexes else None,
+        'songs': songs,
+        'schedule': schedule
+    }
+
+def get_schedule_shards(game_schedule: dict) -> dict:
+    # splits a compact schedule into one smaller schedule of the same shape per month, keyed by 'YYYY-MM'
+    # every shard only carries the songs its own days point at
+    shards = {}
+    if not game_schedule['schedule']:
+        return shards
+    day = datetime.datetime.strptime(game_schedule['firstDay'], '%Y-%m-%d')
+    shard_song_indexes = {}
+    for song_index in game_schedule['schedule']:
+        day_string = day.strftime('%Y-%m-%d')
+        month = day_string[:7]
+        if month not in shards:
+            shards[month] = {'firstDay': day_string, 'songs': [], 'schedule': []}
+            shard_song_indexes = {}
+        shard = shards[month]
+        if song_index < 0:
+            shard['schedule'].append(-1)
+        else:
+            if song_index not in shard_song_indexes:
+                shard_song_indexes[song_index] = len(shard['songs'])
+                shard['songs'].append(game_schedule['songs'][song_index])
+            shard['schedule'].append(shard_song_indexes[song_index])
+        day += datetime.timedelta(days=1)
+    return shards
+
+@contextmanager
+def atomic_write(path: str):
+    # yields a binary temp file next to path, which replaces path only once everything was written and synced,
+    # so the dev server (or a CDN sync) never sees a missing or half written file
+    directory = os.path.dirname(path) or '.'
+    f = tempfile.NamedTemporaryFile('wb', dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp', delete=False)
+    try:
+        with f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path) and filecmp.cmp(f.name, path, shallow=False):
+            # leave files that didn't change alone, so nothing watching them reloads for no reason
+            os.remove(f.name)
+            return
+        # NamedTemporaryFile is only readable by us, but these get served
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, path)
+    except BaseException:
+        if os.path.exists(f.name):
+            os.remove(f.name)
+        raise
+
+def dumps_json(data, indent: bool = False) -> bytes:
+    # orjson and the json module give the exact same bytes here: two space indents or no whitespace at all,
+    # and non-ascii characters as utf-8 instead of escapes
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf8')
+
+def iter_json_chunks(data, indent: bool = False) -> Iterator[bytes]:
+    # top level lists get encoded one item at a time, so we never hold the whole file as one string
+    if not isinstance(data, list) or not data:
+        yield dumps_json(data, indent)
+        return
+    yield b'[\n  ' if indent else b'['
+    for index, item in enumerate(data):
+        if index:
+            yield b',\n  ' if indent else b','
+        # json strings can't contain raw newlines, so this only indents the item's own lines
+        yield dumps_json(item, indent).replace(b'\n', b'\n  ') if indent else dumps_json(item)
+    yield b'\n]' if indent else b']'
+
+def write_json(path: str, data, indent: bool = False):
+    with atomic_write(path) as f:
+        for chunk in iter_json_chunks(data, indent):
+            f.write(chunk)
+
+def write_schedule_shards(game_schedule: dict, shards_path: str = SCHEDULE_SHARDS_PATH, grace_days: int = SCHEDULE_SHARD_GRACE_DAYS) -> dict:
+    # writes every month of the schedule to its own file, named after a hash of its contents so CDN caches
+    # stay valid for months a rebake didn't touch, plus a manifest.json pointing at the current files
+    os.makedirs(shards_path, exist_ok=True)
+    shard_files = {}
+    for month, shard in get_schedule_shards(game_schedule).items():
+        shard_json = dumps_json(shard)
+        shard_hash = hashlib.sha1(shard_json).hexdigest()[:12]
+        shard_file = f'{month}.{shard_hash}.json'
+        if os.path.exists(os.path.join(shards_path, shard_file)):
+            # the mtime says when a manifest last pointed at the shard, that's what the grace period counts from
+            os.utime(os.path.join(shards_path, shard_file))
+        else:
+            with atomic_write(os.path.join(shards_path, shard_file)) as f:
+                f.write(shard_json)
+        shard_files[month] = shard_file
+
+    manifest = {'firstDay': game_schedule['firstDay'], 'months': shard_files}
+    write_json(os.path.join(shards_path, 'manifest.json'), manifest, indent=True)
+
+    # remove the shards of previous rebakes that no manifest pointed at for the whole grace period
+    # a client that fetched the old manifest right before this rebake can still load its months in the meantime
+    current_files = set(shard_files.values())
+    expiry = time.time() - grace_days * 24 * 60 * 60
+    for entry in os.listdir(shards_path):
+        if entry != 'manifest.json' and entry not in current_files and not entry.endswith('.tmp'):
+            if os.stat(os.path.join(shards_path, entry)).st_mtime < expiry:
+                os.remove(os.path.join(shards_path, entry))
+    return manifest
+
+def get_motif_words(name: str) -> List[str]:
+    # lowercased runs of letters and digits, the front end splits guesses the same way
+    return ''.join(character if character.isalnum() else ' ' for character in name.lower()).split()
+
+def get_columnar_motifs(guesses_array: List[object]) -> dict:
+    # the guesses array repeats the album name, the image url folder and the flags for every motif,
+    # so we store it column by column with the album names and image url folders interned into tables
+    albums = []
+    album_indexes = {}
+    image_url_prefixes = []
+    image_url_prefix_indexes = {}
+    columns = {'slug': [], 'name': [], 'album': [], 'imageUrlPrefix': [], 'imageUrlFile': [], 'flags': [], 'rarity': []}
+    prefix_index = {}
+    for motif_index, motif in enumerate(guesses_array):
+        if motif['albumName'] not in album_indexes:
+            album_indexes[motif['albumName']] = len(albums)
+            albums.append(motif['albumName'])
+        image_url_prefix, image_url_file = motif['imageUrl'].rsplit('/', 1)
+        if image_url_prefix not in image_url_prefix_indexes:
+            image_url_prefix_indexes[image_url_prefix] = len(image_url_prefixes)
+            image_url_prefixes.append(image_url_prefix)
+        columns['slug'].append(motif['slug'])
+        columns['name'].append(motif['name'])
+        columns['album'].append(album_indexes[motif['albumName']])
+        columns['imageUrlPrefix'].append(image_url_prefix_indexes[image_url_prefix])
+        # most thumbnails are just named after the track, those don't need to be spelled out
+        columns['imageUrlFile'].append(None if image_url_file == f"{motif['slug'][6:]}.small.jpg" else image_url_file)
+        # bit 1 is isOfficial, bit 2 is isFandom
+        columns['flags'].append(int(motif['isOfficial']) | int(motif['isFandom']) << 1)
+        columns['rarity'].append(motif['rarity'])
+        for word_prefix in sorted(set(word[:MOTIF_PREFIX_LENGTH] for word in get_motif_words(motif['name']))):
+            prefix_index.setdefault(word_prefix, []).append(motif_index)
+    return {
+        'albums': albums,
+        'imageUrlPrefixes': image_url_prefixes,
+        'columns': columns,
+        'prefixLength': MOTIF_PREFIX_LENGTH,
+        'prefixIndex': prefix_index
+    }
+
+def write_compressed_siblings(path: str):
+    # precompressed copies for servers that can hand out .gz/.br files directly
+    with open(path, 'rb') as f:
+        contents = f.read()
+    with atomic_write(f'{path}.gz') as f:
+        f.write(gzip.compress(contents, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with atomic_write(f'{path}.br') as f:
+            f.write(brotli.compress(contents, quality=11))
+
+def load_game_data(jobs: int = 1, use_cache: bool = True, cache_max_bytes: int = CACHE_MAX_BYTES, use_snapshot: bool = True,
+                   album_path: Optional[str] = None, snapshot_path: str = SNAPSHOT_PATH) -> Tuple[dict, List[Song], Counter, List[str], ReferenceIndex]:
+    # ingests hsmusic-data into the slugs dictionary, the valid songs, the leitmotif counter, the official slugs
+    # and the reference index
+    # everything after this only depends on these, so they can be reused for as many evaluations as we want
+    if album_path is None:
+        file_path = os.path.dirname(os.path.realpath(__file__))
+        hsmusic_data_path = os.path.join(file_path, 'hsmusic-data')
+        album_path = os.path.join(hsmusic_data_path, 'album')
+
+    # without the cache every album gets parsed again, so the snapshot only gets written
+    snapshot = open_snapshot(album_path, snapshot_path) if use_snapshot and use_cache else None
+    if snapshot is not None:
+        album_records = iter_snapshot_album_records(snapshot)
+    else:
+        album_records = iter_album_records(album_path, jobs, use_cache, cache_max_bytes)
+        if use_snapshot:
+            album_records = snapshot_album_records(album_records, album_path, snapshot_path)
+
+    # the albums stream through twice: once for the slugs, and once more from the spool for the songs
+    # parsing happens lazily as the slugs get loaded, so it's timed as part of that stage
+    with tempfile.TemporaryFile() as songs_spool:
+        rereleases = []
+        with run_report.stage('loadSlugs'):
+            slugs_dict = load_slugs(collect_album_rereleases(spool_album_records(album_records, songs_spool), rereleases))
+        with run_report.stage('referenceIndex'):
+            reference_index = ReferenceIndex(slugs_dict, rereleases)
+        with run_report.stage('getValidSongs'):
+            songs, leitmotif_counter, official_slugs = get_valid_songs(reference_index, iter_spooled_album_records(songs_spool))
+    if snapshot is not None:
+        snapshot.close()
+
+    return slugs_dict, songs, leitmotif_counter, official_slugs, reference_index
+
+def ingest_album_records(album_records: List[dict]) -> Tuple[dict, List[Song], Counter, List[str], ReferenceIndex]:
+    # same as load_game_data, but for album records that are already in memory, like the ones --watch keeps
+    with run_report.stage('loadSlugs'):
+        slugs_dict = load_slugs(album_records)
+    with run_report.stage('referenceIndex'):
+        reference_index = ReferenceIndex(slugs_dict, [rerelease for album_record in album_records for rerelease in album_record['rereleases']])
+    with run_report.stage('getValidSongs'):
+        songs, leitmotif_counter, official_slugs = get_valid_songs(reference_index, album_records)
+    return slugs_dict, songs, leitmotif_counter, official_slugs, reference_index
+
+def load_game_songs(path: str) -> List[Song]:
+    with open(path, 'r') as f:
+        return [Song.from_json(song) for song in json.loads(f.read())]
 
+def load_old_game_songs() -> List[Song]:
     # check if an old song file exist
-    old_game_songs_file = None
     old_game_songs = []
-    if os.path.exists(os.path.join(OUTPUT_PATH, 'game_songs_old.json')):
-        with open(os.path.join(OUTPUT_PATH, 'game_songs_old.json'), 'r') as f:
-            old_game_songs_file = json.loads(f.read())
-    
     # if it exists, and the date is before the original date, we want to use the old songs and remove them from being picked
-    if old_game_songs_file is not None:
-        print(f"Using old songs from {ORIGINAL_DATETIME} to {START_DATETIME}")
-        for index in range(len(old_game_songs_file)):
-            old_game_songs.append(old_game_songs_file[index])
+    if os.path.exists(os.path.join(OUTPUT_PATH, 'game_songs_old.json')):
+        logger.info('Using old songs from %s to %s', ORIGINAL_DATETIME, START_DATETIME)
+        old_game_songs = load_game_songs(os.path.join(OUTPUT_PATH, 'game_songs_old.json'))
+    return old_game_songs
 
-    songs, leitmotif_counter, official_slugs = get_valid_songs(slugs_dict, album_path)
-    # ugly exception, we need to manually add unreleased famous songs to official_slugs
-    official_slugs.append('track:penumbra-phantasm')
-    official_slugs.append('track:double-midnight')
+def get_lock_day() -> str:
+    return (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=LOCK_AHEAD_DAYS)).strftime('%Y-%m-%d')
+
+def load_locked_game_songs(schedule_store: ScheduleStore, lock_day: str) -> List[Song]:
+    # whatever the last rebake deployed up to lock_day may have been played already, so it gets locked
+    # before we compute anything. the first time around, this bootstraps the history from the baked files
+    for songs_file in ['game_songs.json', 'game_songs_old.json']:
+        songs_path = os.path.join(OUTPUT_PATH, songs_file)
+        if os.path.exists(songs_path):
+            n_locked = schedule_store.lock(load_game_songs(songs_path), lock_day)
+            run_report.counters['daysLocked'] += n_locked
+            break
+    logger.info('%d days up to %s are locked', len(schedule_store.songs), schedule_store.get_last_day())
+    return schedule_store.songs
+
+def get_game_data(store: bool = True, jobs: int = 1, use_cache: bool = True, cache_max_bytes: int = CACHE_MAX_BYTES, use_snapshot: bool = True, compact: bool = False,
+                  append: bool = True, album_records: Optional[List[dict]] = None) -> List[Song]:
+    # with append, every day in the schedule history stays exactly as it is and only the days after it get computed
+    # otherwise, every day from START_DATETIME on gets computed again from scratch
+    # album_records skips reading hsmusic-data and bakes those records instead
+    global run_report
+    run_report = RunReport()
+
+    if album_records is not None:
+        slugs_dict, songs, leitmotif_counter, official_slugs, _ = ingest_album_records(album_records)
+    else:
+        slugs_dict, songs, leitmotif_counter, official_slugs, _ = load_game_data(jobs, use_cache, cache_max_bytes, use_snapshot)
+    start_datetime = START_DATETIME
+    if append:
+        schedule_store = ScheduleStore(SCHEDULE_HISTORY_PATH)
+        lock_day = get_lock_day()
+        old_game_songs = load_locked_game_songs(schedule_store, lock_day)
+        if old_game_songs:
+            start_datetime = datetime.datetime.strptime(get_next_day(old_game_songs[-1].day), '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+    else:
+        old_game_songs = load_old_game_songs()
 
     five_hundred_most_common = leitmotif_counter.most_common(500)
 
-    common_leitmotif_threshold = 20
-    uncommon_leitmotif_threshold = 10
-    rare_leitmotif_threshold = 4
-    min_leitmotifs = 3
-    max_leitmotifs = 999
-
-    filtered_songs = filter_songs(
-        songs, old_game_songs, leitmotif_counter, official_slugs,
-        common_leitmotif_threshold, 
-        uncommon_leitmotif_threshold, 
-        rare_leitmotif_threshold,
-        min_leitmotifs,
-        max_leitmotifs
-    )
+    common_leitmotif_threshold = COMMON_LEITMOTIF_THRESHOLD
+    uncommon_leitmotif_threshold = UNCOMMON_LEITMOTIF_THRESHOLD
+    rare_leitmotif_threshold = RARE_LEITMOTIF_THRESHOLD
+    min_leitmotifs = MIN_LEITMOTIFS
+    max_leitmotifs = MAX_LEITMOTIFS
+
+    with run_report.stage('motifMatrix'):
+        motif_matrix = MotifMatrix(songs, leitmotif_counter, official_slugs)
 
-    print(f'Filtered {len(filtered_songs)} songs')
+    with run_report.stage('filterSongs'):
+        filtered_songs = filter_songs(
+            songs, old_game_songs, leitmotif_counter, official_slugs,
+            common_leitmotif_threshold, 
+            uncommon_leitmotif_threshold, 
+            rare_leitmotif_threshold,
+            min_leitmotifs,
+            max_leitmotifs,
+            motif_matrix,
+            start_datetime
+        )
+
+    run_report.counters['songsPlayable'] = len(filtered_songs)
+    logger.info('Filtered %d songs', len(filtered_songs))
 
     # add the old songs to the filtered songs
     game_songs = old_game_songs + filtered_songs
 
-    # Now, if we have a target END_DATETIME, we loop the entire game_songs list until we reach it.
-    if game_songs:
-        last_day_str = game_songs[-1]['day']
-        last_day = datetime.datetime.strptime(last_day_str, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
-        current_day = last_day + datetime.timedelta(days=1)
-
-        # Loop through game_songs repeatedly until we reach END_DATETIME
-        song_index = 0
-        while current_day <= END_DATETIME:
-            # We reuse songs from game_songs, in order, wrapping around as needed.
-            base_song = game_songs[song_index % len(game_songs)]
-            looped_song = dict(base_song)
-            # Update the day for this looped instance
-            looped_song['day'] = current_day.strftime('%Y-%m-%d')
-            game_songs.append(looped_song)
-            current_day += datetime.timedelta(days=1)
-            song_index += 1
-
-    guesses_array = get_guesses_array(slugs_dict, leitmotif_counter, common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold)
-    print(f'Found {len(guesses_array)} guesses')
+    with run_report.stage('loopSongs'):
+        # Now, if we have a target END_DATETIME, we loop the entire game_songs list until we reach it.
+        if game_songs:
+            last_day_str = game_songs[-1].day
+            last_day = datetime.datetime.strptime(last_day_str, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+            current_day = last_day + datetime.timedelta(days=1)
+
+            # Loop through game_songs repeatedly until we reach END_DATETIME
+            # locked days can already contain part of the loop, so it picks up after the days it already replayed
+            song_index = 0
+            for song in game_songs[1:]:
+                if replace(song, day=None) == replace(game_songs[song_index], day=None):
+                    song_index += 1
+            while current_day <= END_DATETIME:
+                # We reuse songs from game_songs, in order, wrapping around as needed.
+                base_song = game_songs[song_index % len(game_songs)]
+                # with the day updated for this looped instance
+                looped_song = replace(base_song, day=current_day.strftime('%Y-%m-%d'))
+                game_songs.append(looped_song)
+                current_day += datetime.timedelta(days=1)
+                song_index += 1
+
+    with run_report.stage('getGuessesArray'):
+        guesses_array = get_guesses_array(slugs_dict, leitmotif_counter, common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold)
+    run_report.counters['guesses'] = len(guesses_array)
+    logger.info('Found %d guesses', len(guesses_array))
     
     # order guesses_array by descending rarity, and then alphabetical order
-    guesses_array = sorted(guesses_array, key=lambda k: (-k['rarity'], k['name']))
+    guesses_array = sorted(guesses_array, key=lambda k: (-k.rarity, k.name))
     if store:
-        motifs_path = os.path.join(OUTPUT_PATH, 'game_motifs.json')
-        if os.path.exists(motifs_path):
-            os.remove(motifs_path)
-        with open(motifs_path, 'w') as f:
-            f.write(json.dumps(guesses_array, indent=2))
+        with run_report.stage('writeMotifs'):
+            guesses_json = [guess.to_json() for guess in guesses_array]
+            write_json(os.path.join(OUTPUT_PATH, 'game_motifs.json'), guesses_json, indent=not compact)
+            # the site downloads the slimmer columnar variant instead
+            min_motifs_path = os.path.join(OUTPUT_PATH, 'game_motifs.min.json')
+            write_json(min_motifs_path, get_columnar_motifs(guesses_json))
+            write_compressed_siblings(min_motifs_path)
 
     # count representation of album names in the filtered songs
-    album_names = [song['albumName'] for song in game_songs]
+    album_names = [song.album_name for song in game_songs]
     album_counter = Counter(album_names)
     # count representation of is_official
-    is_official = [song['isOfficial'] for song in game_songs]
+    is_official = [song.is_official for song in game_songs]
     is_official_counter = Counter(is_official)
     # count representation of url_type
-    url_types = [song['urlType'] for song in game_songs]
+    url_types = [song.url_type for song in game_songs]
     url_type_counter = Counter(url_types)
-    print(f'Found {url_type_counter["youtube"]} youtube links and {url_type_counter["soundcloud"]} soundcloud links')
+    run_report.counters['gameDays'] = len(game_songs)
+    run_report.counters['youtubeLinks'] = url_type_counter['youtube']
+    run_report.counters['soundcloudLinks'] = url_type_counter['soundcloud']
+    logger.info('Found %d youtube links and %d soundcloud links', url_type_counter['youtube'], url_type_counter['soundcloud'])
     # count representation of rarity per motif
-    rarity = [song['rarity'] for song in guesses_array]
+    rarity = [guess.rarity for guess in guesses_array]
     rarity_counter = Counter(rarity)
 
     if store:
-        songs_path = os.path.join(OUTPUT_PATH, 'game_songs.json')
-        if os.path.exists(songs_path):
-            os.remove(songs_path)
-        with open(songs_path, 'w') as f:
-            f.write(json.dumps(game_songs, indent=2))
+        with run_report.stage('writeSongs'):
+            game_songs_json = [song.to_json() for song in game_songs]
+            write_json(os.path.join(OUTPUT_PATH, 'game_songs.json'), game_songs_json, indent=not compact)
+
+            # game_songs.json stays around since it's what we archive and read old songs from,
+            # but the site only downloads the compact schedule
+            game_schedule = get_game_schedule(game_songs_json)
+            write_json(os.path.join(OUTPUT_PATH, 'game_schedule.json'), game_schedule)
+            write_schedule_shards(game_schedule)
+
+        if append:
+            # whatever we just baked up to the lock day is live as soon as it's deployed
+            # the history only gets written here, on a real bake, together with the days locked before computing
+            run_report.counters['daysLocked'] += schedule_store.lock(game_songs, lock_day)
+            schedule_store.save()
+
+        write_json(RUN_REPORT_PATH, run_report.to_json(), indent=True)
+        logger.info('Rebaked in %.2fs, wrote the run report to %s', sum(run_report.stages.values()), RUN_REPORT_PATH)
 
     return game_songs
 
+# Set in every sweep worker by init_sweep_worker, so the matrix is only sent to each process once
+sweep_state = None
+
+def init_sweep_worker(state: dict):
+    global sweep_state
+    sweep_state = state
+
+def evaluate_thresholds(thresholds: Tuple[int, int, int, int, int]) -> dict:
+    # evaluates one combination of thresholds against the sweep state, returning one row of the report
+    common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold, min_leitmotifs, max_leitmotifs = thresholds
+    motif_matrix = sweep_state['motif_matrix']
+    playable_mask = motif_matrix.get_playable_mask(
+        common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold,
+        min_leitmotifs, max_leitmotifs, sweep_state['old_slugs']
+    )
+    n_playable = int(playable_mask.sum())
+    n_official = int((playable_mask & sweep_state['is_official_song']).sum())
+    n_fandom = int((playable_mask & sweep_state['is_fandom_song']).sum())
+    rarities = get_rarity_tiers(
+        sweep_state['guess_counts'], sweep_state['is_official_guess'],
+        common_leitmotif_threshold, uncommon_leitmotif_threshold, rare_leitmotif_threshold
+    )
+    rarity_histogram = np.bincount(rarities, minlength=6)
+    row = {
+        'commonLeitmotifThreshold': common_leitmotif_threshold,
+        'uncommonLeitmotifThreshold': uncommon_leitmotif_threshold,
+        'rareLeitmotifThreshold': rare_leitmotif_threshold,
+        'minLeitmotifs': min_leitmotifs,
+        'maxLeitmotifs': max_leitmotifs,
+        # how many days the new songs last before the schedule starts looping
+        'playableSongs': n_playable,
+        'officialSongs': n_official,
+        'fandomSongs': n_fandom,
+        'officialRatio': round(n_official / n_playable, 4) if n_playable else 0,
+        'fandomRatio': round(n_fandom / n_playable, 4) if n_playable else 0,
+    }
+    for rarity in range(1, 6):
+        row[f'rarity{rarity}Motifs'] = int(rarity_histogram[rarity])
+    return row
+
+def sweep_thresholds(threshold_grid: dict, jobs: int = 1, use_cache: bool = True, cache_max_bytes: int = CACHE_MAX_BYTES, use_snapshot: bool = True,
+                     append: bool = True) -> List[dict]:
+    # ingests the wiki once and evaluates every combination of the thresholds in threshold_grid, which maps
+    # 'common', 'uncommon', 'rare', 'min_leitmotifs' and 'max_leitmotifs' to lists of values to try
+    # the songs it leaves out are the same ones get_game_data would, the locked days with append or the old file without
+    slugs_dict, songs, leitmotif_counter, official_slugs, _ = load_game_data(jobs, use_cache, cache_max_bytes, use_snapshot)
+    if append:
+        old_game_songs = load_locked_game_songs(ScheduleStore(SCHEDULE_HISTORY_PATH), get_lock_day())
+    else:
+        old_game_songs = load_old_game_songs()
+
+    guessed_tracks = [(slug, track) for slug, track in slugs_dict.items() if slug in leitmotif_counter]
+    state = {
+        'motif_matrix': MotifMatrix(songs, leitmotif_counter, official_slugs),
+        'old_slugs': set(song.slug for song in old_game_songs),
+        'is_official_song': np.array([song.is_official for song in songs], dtype=bool),
+        'is_fandom_song': np.array([song.is_fandom for song in songs], dtype=bool),
+        'guess_counts': np.array([leitmotif_counter[slug] for slug, _ in guessed_tracks], dtype=np.int64),
+        'is_official_guess': np.array([track.is_official for _, track in guessed_tracks], dtype=bool),
+    }
+    combinations = list(itertools.product(
+        threshold_grid['common'], threshold_grid['uncommon'], threshold_grid['rare'],
+        threshold_grid['min_leitmotifs'], threshold_grid['max_leitmotifs']
+    ))
+    logger.info('Evaluating %d threshold combinations with %d job(s)...', len(combinations), jobs)
+
+    if jobs > 1 and len(combinations) > 1:
+        chunksize = max(1, len(combinations) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_sweep_worker, initargs=(state,)) as executor:
+            return list(executor.map(evaluate_thresholds, combinations, chunksize=chunksize))
+    init_sweep_worker(state)
+    return [evaluate_thresholds(thresholds) for thresholds in combinations]
+
+def write_sweep_report(rows: List[dict], path: str):
+    # .json paths get a json array, anything else a csv table
+    if os.path.splitext(path)[1] == '.json':
+        with open(path, 'w') as f:
+            f.write(json.dumps(rows, indent=2))
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+
+def parse_int_list(string: str) -> List[int]:
+    return [int(value) for value in string.split(',') if value.strip()]
+
+def get_album_mtimes(album_path) -> dict:
+    return {
+        os.path.splitext(entry.name)[0]: entry.stat().st_mtime_ns
+        for entry in os.scandir(album_path) if os.path.splitext(entry.name)[1] == '.yaml'
+    }
+
+def watch_game_data(jobs: int = 1, use_cache: bool = True, cache_max_bytes: int = CACHE_MAX_BYTES, compact: bool = False, append: bool = True,
+                    interval: float = WATCH_INTERVAL):
+    # bakes once, then keeps every album record in memory and polls hsmusic-data/album. whenever album files change
+    # only those get extracted again before everything gets rebaked from memory, and the writers leave every
+    # output that came out the same untouched. editing this script restarts it, since the constants live here
+    album_path = os.path.join(file_path, 'hsmusic-data', 'album')
+    script_mtime = os.stat(os.path.realpath(__file__)).st_mtime_ns
+    album_mtimes = get_album_mtimes(album_path)
+    records = {album_record['album_name']: album_record for album_record in iter_album_records(album_path, jobs, use_cache, cache_max_bytes)}
+    fingerprint = get_extraction_fingerprint() if use_cache else None
+
+    def rebake(reason: str):
+        start = time.perf_counter()
+        # same album order as a full rebake, since it decides slug precedence and the shuffle
+        album_names = [os.path.splitext(album)[0] for album in os.listdir(album_path) if os.path.splitext(album)[1] == '.yaml']
+        get_game_data(store=True, compact=compact, append=append, album_records=[records[name] for name in album_names if name in records])
+        logger.info('Rebaked %s in %.2fs, watching %s for changes...', reason, time.perf_counter() - start, album_path)
+
+    rebake('everything')
+    while True:
+        time.sleep(interval)
+        if os.stat(os.path.realpath(__file__)).st_mtime_ns != script_mtime:
+            logger.info('%s changed, restarting...', os.path.basename(__file__))
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+
+        new_album_mtimes = get_album_mtimes(album_path)
+        changed_albums = [name for name, mtime in new_album_mtimes.items() if album_mtimes.get(name) != mtime]
+        removed_albums = [name for name in album_mtimes if name not in new_album_mtimes]
+        if not changed_albums and not removed_albums:
+            continue
+        album_mtimes = new_album_mtimes
+
+        replaced_albums = [album_name for album_name in removed_albums if records.pop(album_name, None) is not None]
+        for album_name in changed_albums:
+            album_file = os.path.join(album_path, f'{album_name}.yaml')
+            cache_file = get_cache_file(album_name, album_file, fingerprint) if use_cache else None
+            try:
+                album_record = read_cache_file(cache_file) if use_cache else None
+                if album_record is None:
+                    album_record = extract_album(album_name, album_file)
+                    if use_cache:
+                        write_cache_file(cache_file, album_record)
+            except Exception as e:
+                # probably caught in the middle of a save (half an album can fail in all sorts of ways),
+                # the next one will trigger another rebake anyway
+                logger.error('Could not read %s, keeping its previous version: %s', album_file, e)
+                continue
+            # saving without changing anything still bumps the mtime
+            if album_record == records.get(album_name):
+                continue
+            records[album_name] = album_record
+            replaced_albums.append(album_name)
+        if replaced_albums:
+            rebake(', '.join(replaced_albums))
+
 def backup_old_files():
     # backs up old game_songs.json to store old dates
     # this is so we can revert to the old version if we need to
     # and we can also access it when we're creating new versions
+    # it's a copy, so the live file stays in place until the rebake atomically replaces it
     songs_path = os.path.join(OUTPUT_PATH, 'game_songs.json')
     if os.path.exists(songs_path):
-        # remove previous backup
-        if os.path.exists(os.path.join(OUTPUT_PATH, 'game_songs_old.json')):
-            os.remove(os.path.join(OUTPUT_PATH, 'game_songs_old.json'))
-        os.rename(songs_path, os.path.join(OUTPUT_PATH, f'game_songs_old.json'))
+        with open(songs_path, 'rb') as source, atomic_write(os.path.join(OUTPUT_PATH, 'game_songs_old.json')) as f:
+            shutil.copyfileobj(source, f)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebakes the Motifle song and motif files from hsmusic-data')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='number of processes used to parse album files (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='parse every album again instead of reusing the records of unchanged albums from the cache or the snapshot')
+    parser.add_argument('--cache-size', type=int, default=CACHE_MAX_BYTES // (1024 * 1024),
+                        help='maximum size of the album cache in MB (default: %(default)s)')
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help='neither read nor write the SQLite snapshot of hsmusic-data')
+    parser.add_argument('--build-snapshot', action='store_true',
+                        help='only ingest hsmusic-data into the SQLite snapshot, without rebaking anything')
+    parser.add_argument('--sweep', action='store_true',
+                        help='instead of rebaking, evaluate every combination of the threshold lists below and write a report')
+    parser.add_argument('--common', type=parse_int_list, default=[COMMON_LEITMOTIF_THRESHOLD],
+                        help='comma separated common leitmotif thresholds to sweep')
+    parser.add_argument('--uncommon', type=parse_int_list, default=[UNCOMMON_LEITMOTIF_THRESHOLD],
+                        help='comma separated uncommon leitmotif thresholds to sweep')
+    parser.add_argument('--rare', type=parse_int_list, default=[RARE_LEITMOTIF_THRESHOLD],
+                        help='comma separated rare leitmotif thresholds to sweep')
+    parser.add_argument('--min-leitmotifs', type=parse_int_list, default=[MIN_LEITMOTIFS],
+                        help='comma separated minimum leitmotif counts to sweep')
+    parser.add_argument('--max-leitmotifs', type=parse_int_list, default=[MAX_LEITMOTIFS],
+                        help='comma separated maximum leitmotif counts to sweep')
+    parser.add_argument('--sweep-output', default='threshold_sweep.csv',
+                        help='where to write the sweep report, as json if it ends in .json and csv otherwise (default: %(default)s)')
+    parser.add_argument('--watch', action='store_true',
+                        help='rebake whenever a file in hsmusic-data/album changes, only reparsing the albums that changed')
+    parser.add_argument('--no-append', action='store_true',
+                        help='ignore the schedule history and compute every day from START_DATETIME on again')
+    parser.add_argument('--compact', action='store_true',
+                        help='write game_motifs.json and game_songs.json without indentation')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='also log every album and skipped song, and the time of every stage')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='only log warnings')
+    parser.add_argument('--profile', default=None,
+                        help='run the rebake under cProfile, dump the stats to this path and log the slowest functions')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='trace allocations with tracemalloc and add the peak memory of every stage to the run report')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO,
+        format='%(levelname)s: %(message)s'
+    )
+
+    if args.build_snapshot:
+        album_path = os.path.join(file_path, 'hsmusic-data', 'album')
+        album_records = iter_album_records(album_path, max(1, args.jobs), not args.no_cache, args.cache_size * 1024 * 1024)
+        for _ in snapshot_album_records(album_records, album_path):
+            pass
+        sys.exit(0)
+
+    if args.sweep:
+        threshold_grid = {
+            'common': args.common,
+            'uncommon': args.uncommon,
+            'rare': args.rare,
+            'min_leitmotifs': args.min_leitmotifs,
+            'max_leitmotifs': args.max_leitmotifs,
+        }
+        rows = sweep_thresholds(threshold_grid, jobs=max(1, args.jobs), use_cache=not args.no_cache, cache_max_bytes=args.cache_size * 1024 * 1024, use_snapshot=not args.no_snapshot,
+                                 append=not args.no_append)
+        write_sweep_report(rows, args.sweep_output)
+        logger.info('Wrote %d threshold combinations to %s', len(rows), args.sweep_output)
+        sys.exit(0)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+
     backup_old_files()
-    get_game_data(store=True)
+    if args.watch:
+        try:
+            watch_game_data(jobs=max(1, args.jobs), use_cache=not args.no_cache, cache_max_bytes=args.cache_size * 1024 * 1024, compact=args.compact, append=not args.no_append)
+        except KeyboardInterrupt:
+            sys.exit(0)
+    get_game_data(store=True, jobs=max(1, args.jobs), use_cache=not args.no_cache, cache_max_bytes=args.cache_size * 1024 * 1024, use_snapshot=not args.no_snapshot, compact=args.compact, append=not args.no_append)
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        stats_output = io.StringIO()
+        pstats.Stats(profiler, stream=stats_output).sort_stats('cumulative').print_stats(20)
+        logger.info('Wrote the profile to %s, slowest functions:\n%s', args.profile, stats_output.getvalue())
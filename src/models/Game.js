@@ -15,9 +15,9 @@ export const RARITY_POINTS = {
 };
 
 class Game {
-    constructor(dateString, songsArray, motifsArray) {
+    constructor(dateString, schedule, motifsArray) {
         this.dateString = dateString;
-        this.song = songsArray.find((song) => song.day === dateString);
+        this.song = schedule.getSong(dateString);
         this.submittedMotifs = [];
         this.displayedMotifs = this.initializeDisplayedMotifs(motifsArray);
         this.status = GAME_STATUS.ONGOING;
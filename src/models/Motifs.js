@@ -0,0 +1,62 @@
+// bits of the flags column in game_motifs.min.json
+export const MOTIF_FLAGS = {
+    OFFICIAL: 1,
+    FANDOM: 2
+};
+
+export function getMotifWords(name) {
+    // lowercased runs of letters and digits, hsmusicToSongs.py splits motif names the same way
+    return name.toLowerCase().split(/[^\p{L}\p{N}]+/u).filter((word) => word);
+}
+
+function isFuzzyMatch(lowerQuery, lowerName) {
+    // the same test the typeahead's fuzzy matcher does: every character of the query shows up in the name, in order
+    let queryIndex = 0;
+    for (let i = 0; i < lowerName.length && queryIndex < lowerQuery.length; i++) {
+        if (lowerName[i] === lowerQuery[queryIndex]) queryIndex++;
+    }
+    return queryIndex === lowerQuery.length;
+}
+
+class MotifIndex {
+    // wraps the columnar game_motifs.min.json written by hsmusicToSongs.py
+    constructor(columnarMotifs) {
+        const { albums, imageUrlPrefixes, columns } = columnarMotifs;
+        // rebuild the same motif objects game_motifs.json used to have, so the rest of the game doesn't care
+        this.motifs = columns.slug.map((slug, i) => {
+            const imageUrlFile = columns.imageUrlFile[i] ?? `${slug.slice(6)}.small.jpg`;
+            return {
+                name: columns.name[i],
+                albumName: albums[columns.album[i]],
+                isOfficial: (columns.flags[i] & MOTIF_FLAGS.OFFICIAL) !== 0,
+                isFandom: (columns.flags[i] & MOTIF_FLAGS.FANDOM) !== 0,
+                imageUrl: `${imageUrlPrefixes[columns.imageUrlPrefix[i]]}/${imageUrlFile}`,
+                slug,
+                rarity: columns.rarity[i]
+            };
+        });
+        this.prefixLength = columnarMotifs.prefixLength;
+        this.prefixIndex = columnarMotifs.prefixIndex;
+        this.prefixMotifs = new Map();
+    }
+
+    search(query) {
+        // hands the typeahead only the motifs with a word starting like the first word of the query, so its fuzzy
+        // matcher doesn't go through the whole list on every keystroke. a query that only matches the middle of a
+        // word ("lovania" for MeGaLoVania) would lose its motif that way, so whenever none of the prefix hits match
+        // the query the way the fuzzy matcher does, it gets the full list instead
+        const [firstWord] = getMotifWords(query);
+        if (!firstWord || firstWord.length < this.prefixLength) return this.motifs;
+        const prefix = firstWord.slice(0, this.prefixLength);
+        const motifIndexes = this.prefixIndex[prefix];
+        if (!motifIndexes) return this.motifs;
+        if (!this.prefixMotifs.has(prefix)) {
+            this.prefixMotifs.set(prefix, motifIndexes.map((i) => this.motifs[i]));
+        }
+        const prefixMotifs = this.prefixMotifs.get(prefix);
+        const lowerQuery = query.toLowerCase();
+        return prefixMotifs.some((motif) => isFuzzyMatch(lowerQuery, motif.name.toLowerCase())) ? prefixMotifs : this.motifs;
+    }
+}
+
+export default MotifIndex;
@@ -0,0 +1,61 @@
+const MS_PER_DAY = 24 * 60 * 60 * 1000;
+
+class Schedule {
+    // wraps the compact game_schedule.json written by hsmusicToSongs.py:
+    // a deduplicated song table plus one song index per day, starting at firstDay
+    constructor(scheduleObject) {
+        this.firstDay = scheduleObject.firstDay;
+        this.songs = scheduleObject.songs;
+        this.schedule = scheduleObject.schedule;
+        this.firstDayTime = Date.parse(this.firstDay);
+    }
+
+    getSong(dateString) {
+        // 'YYYY-MM-DD' strings parse as UTC midnight, so the difference is always a whole number of days
+        const dayIndex = Math.round((Date.parse(dateString) - this.firstDayTime) / MS_PER_DAY);
+        if (!(dayIndex >= 0 && dayIndex < this.schedule.length)) return undefined;
+        const songIndex = this.schedule[dayIndex];
+        if (songIndex < 0) return undefined;
+        // hand out a copy with the day, like the entries of the old game_songs.json
+        return { ...this.songs[songIndex], day: dateString };
+    }
+}
+
+export class ShardedSchedule {
+    // same interface as Schedule, but backed by the per month shards listed in schedule/manifest.json
+    // months have to be fetched with load() before getSong() can return their songs
+    constructor(manifest, baseUrl = '/schedule/') {
+        this.manifest = manifest;
+        this.baseUrl = baseUrl;
+        this.shards = {};
+        this.loadingShards = {};
+    }
+
+    async load(dateStrings) {
+        const months = [...new Set(dateStrings.map((dateString) => dateString.slice(0, 7)))];
+        await Promise.all(months.filter((month) => this.manifest.months[month]).map((month) => this.loadMonth(month)));
+    }
+
+    loadMonth(month) {
+        if (!this.loadingShards[month]) {
+            this.loadingShards[month] = fetch(this.baseUrl + this.manifest.months[month])
+                .then((response) => response.json())
+                .then((shard) => {
+                    this.shards[month] = new Schedule(shard);
+                })
+                .catch((e) => {
+                    // forget the failed request so the next load() can try again
+                    delete this.loadingShards[month];
+                    throw e;
+                });
+        }
+        return this.loadingShards[month];
+    }
+
+    getSong(dateString) {
+        const shard = this.shards[dateString.slice(0, 7)];
+        return shard ? shard.getSong(dateString) : undefined;
+    }
+}
+
+export default Schedule;
@@ -0,0 +1,76 @@
+# Tests for diffSchedules.py, run with python -m pytest
+# Schedules come from the checked in bake of the synthetic wiki, which runs from 2024-12-19 to 2025-01-28
+
+import json
+import os
+
+import pytest
+
+import diffSchedules
+import hsmusicToSongs as bake
+
+GAME_SONGS_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'test_fixtures', 'bake', 'game_songs.json')
+
+@pytest.fixture
+def game_songs_json():
+    with open(GAME_SONGS_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_game_songs(path, game_songs_json) -> str:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(game_songs_json, f)
+    return str(path)
+
+def run_diff(monkeypatch, old_path, new_path, *args) -> int:
+    monkeypatch.setattr('sys.argv', ['diffSchedules.py', old_path, new_path, '--today', '2025-01-01', *args])
+    try:
+        diffSchedules.main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+def test_played_day_with_another_track_fails(tmp_path, monkeypatch, game_songs_json):
+    # same slug, different track, like two albums with a song of the same name
+    game_songs_json[5] = {**game_songs_json[5], 'albumName': 'Another Album', 'url': 'https://youtu.be/another'}
+    new_path = write_game_songs(tmp_path / 'new.json', game_songs_json)
+    assert run_diff(monkeypatch, GAME_SONGS_PATH, new_path) == 1
+    report = diffSchedules.diff_schedules(diffSchedules.Schedule(GAME_SONGS_PATH), diffSchedules.Schedule(new_path), '2025-01-02')
+    assert report['historyViolations'] == [{'day': game_songs_json[5]['day'], 'oldSlug': game_songs_json[5]['slug'], 'newSlug': game_songs_json[5]['slug']}]
+
+def test_played_day_with_another_slug_fails(tmp_path, monkeypatch, game_songs_json):
+    game_songs_json[0], game_songs_json[1] = {**game_songs_json[1], 'day': game_songs_json[0]['day']}, {**game_songs_json[0], 'day': game_songs_json[1]['day']}
+    assert run_diff(monkeypatch, GAME_SONGS_PATH, write_game_songs(tmp_path / 'new.json', game_songs_json)) == 1
+
+def test_upcoming_changes_pass(tmp_path, monkeypatch, game_songs_json):
+    game_songs_json[20] = {**game_songs_json[30], 'day': game_songs_json[20]['day']}
+    del game_songs_json[-3:]
+    new_path = write_game_songs(tmp_path / 'new.json', game_songs_json)
+    assert run_diff(monkeypatch, GAME_SONGS_PATH, new_path, '--strict') == 0
+    report = diffSchedules.diff_schedules(diffSchedules.Schedule(GAME_SONGS_PATH), diffSchedules.Schedule(new_path), '2025-01-02')
+    assert [entry['day'] for entry in report['changedDays']] == [game_songs_json[20]['day'], '2025-01-26', '2025-01-27', '2025-01-28']
+
+def test_changed_details_only_fail_with_strict(tmp_path, monkeypatch, game_songs_json):
+    game_songs_json[3] = {**game_songs_json[3], 'leitmotifs': game_songs_json[3]['leitmotifs'][:-1]}
+    new_path = write_game_songs(tmp_path / 'new.json', game_songs_json)
+    assert run_diff(monkeypatch, GAME_SONGS_PATH, new_path) == 0
+    assert run_diff(monkeypatch, GAME_SONGS_PATH, new_path, '--strict') == 1
+
+def test_duplicate_days_keep_the_first_song(tmp_path, game_songs_json):
+    duplicate_song = {**game_songs_json[10], 'day': game_songs_json[3]['day']}
+    game_songs_json.insert(4, duplicate_song)
+    schedule = diffSchedules.Schedule(write_game_songs(tmp_path / 'duplicates.json', game_songs_json))
+    assert schedule.days[duplicate_song['day']]['slug'] == game_songs_json[3]['slug']
+    assert schedule.to_json()['duplicateDays'] == [{'day': duplicate_song['day'], 'slug': game_songs_json[3]['slug'], 'ignoredSlugs': [duplicate_song['slug']]}]
+
+def test_every_schedule_format_reads_the_same(tmp_path, game_songs_json):
+    game_schedule = bake.get_game_schedule(game_songs_json)
+    with open(tmp_path / 'game_schedule.json', 'w', encoding='utf-8') as f:
+        json.dump(game_schedule, f)
+    bake.write_schedule_shards(game_schedule, str(tmp_path / 'schedule'))
+    with open(tmp_path / 'schedule_history.jsonl', 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(song) + '\n' for song in game_songs_json)
+
+    expected_days = {song['day']: diffSchedules.get_song_key(song) for song in game_songs_json}
+    for path in ['game_schedule.json', 'schedule', os.path.join('schedule', 'manifest.json'), 'schedule_history.jsonl']:
+        schedule = diffSchedules.Schedule(str(tmp_path / path))
+        assert {day: diffSchedules.get_song_key(song) for day, song in schedule.days.items()} == expected_days, path
@@ -0,0 +1,118 @@
+# Tests for getBandcampYaml.py against the saved pages in test_fixtures/bandcamp, run with python -m pytest
+# Requires pip install pytest on top of what getBandcampYaml.py needs
+# Every fixture starts with a comment saying which URL it was saved for
+
+import os
+
+import pytest
+import requests
+import yaml
+
+import getBandcampYaml as scraper
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'test_fixtures', 'bandcamp')
+BASE_URL = 'https://synthetic.bandcamp.com'
+
+def get_album_yaml_data(album_data: dict) -> dict:
+    # Date Added is whenever the test runs
+    return {key: value for key, value in album_data.items() if key != 'Date Added'}
+
+def test_album_from_tralbum_data():
+    album_data, tracks_data = scraper.extract_bandcamp_album_metadata(f'{BASE_URL}/album/tralbum-album', scraper.FixtureFetcher(FIXTURE_PATH), workers=2)
+    assert get_album_yaml_data(album_data) == {
+        'Album': 'Tralbum Album',
+        'URLs': [f'{BASE_URL}/album/tralbum-album', '-'],
+        'Cover Artists': ['Someone'],
+        'Color': '#ffffff',
+        'Groups': ['-'],
+    }
+    # the track without a link isn't out yet, and the one without an artist comes from its own page's data-tralbum
+    assert tracks_data == [
+        {'Track': 'First Song', 'Artists': ['Artist One'], 'URLs': [f'{BASE_URL}/track/first-song', '-'], 'Duration': '01:35'},
+        {'Track': 'Second Song', 'Artists': ['Artist Two'], 'URLs': [f'{BASE_URL}/track/second-song', '-'], 'Duration': '01:01'},
+        {'Track': 'Third Song', 'Artists': ['Artist Three'], 'URLs': [f'{BASE_URL}/track/third-song', '-'], 'Duration': '03:20'},
+    ]
+
+@pytest.mark.parametrize('html_parser', ['html.parser', 'lxml'])
+def test_album_from_markup(html_parser, monkeypatch):
+    if html_parser == 'lxml':
+        pytest.importorskip('lxml')
+    monkeypatch.setattr(scraper, 'HTML_PARSER', html_parser)
+    album_data, tracks_data = scraper.extract_bandcamp_album_metadata(f'{BASE_URL}/album/markup-album', scraper.FixtureFetcher(FIXTURE_PATH), workers=2)
+    assert get_album_yaml_data(album_data) == {
+        'Album': 'Markup Album',
+        'URLs': [f'{BASE_URL}/album/markup-album', '-'],
+        'Cover Artists': ['Painter'],
+        'Color': '#ffffff',
+        'Groups': ['-'],
+    }
+    assert tracks_data == [
+        {'Track': 'Markup One', 'Artists': ['Artist Four'], 'URLs': [f'{BASE_URL}/track/markup-one', '-'], 'Duration': '01:05'},
+        {'Track': 'Markup Two', 'Artists': ['Artist Five'], 'URLs': [f'{BASE_URL}/track/markup-two', '-']},
+    ]
+
+@pytest.mark.parametrize('page_html', [
+    '<div data-tralbum="[]"></div>',
+    '<div data-tralbum="{&quot;current&quot;: null}"></div>',
+    '<div data-tralbum="{&quot;current&quot;: {}}"></div>',
+    '<div data-tralbum="{not json"></div>',
+    '<div></div>',
+])
+def test_unusable_tralbum_data_falls_back_to_markup(page_html):
+    assert scraper.get_tralbum_data(page_html) is None
+
+def test_missing_fixture():
+    with pytest.raises(FileNotFoundError):
+        scraper.FixtureFetcher(FIXTURE_PATH).fetch(f'{BASE_URL}/album/missing')
+
+def test_batch_writes_one_yaml_per_album_and_keeps_going(tmp_path, monkeypatch):
+    batch_file = tmp_path / 'batch.txt'
+    batch_file.write_text(f'# synthetic albums\n{BASE_URL}/album/tralbum-album\n\n{BASE_URL}/album/missing\n{BASE_URL}/album/markup-album\n', encoding='utf-8')
+    output_path = tmp_path / 'albums'
+    monkeypatch.setattr('sys.argv', ['getBandcampYaml.py', '--fixtures', FIXTURE_PATH, '--batch', str(batch_file), '--output-dir', str(output_path)])
+    # the missing album fails the run, but only after every other album got written
+    with pytest.raises(SystemExit) as exit_info:
+        scraper.main()
+    assert exit_info.value.code == 1
+    assert sorted(os.listdir(output_path)) == ['markup-album.yaml', 'tralbum-album.yaml']
+    with open(output_path / 'tralbum-album.yaml', 'r', encoding='utf-8') as f:
+        documents = [document for document in yaml.safe_load_all(f) if document]
+    assert [document.get('Album') or document['Track'] for document in documents] == ['Tralbum Album', 'First Song', 'Second Song', 'Third Song']
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} error')
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get(self, url, timeout=None):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+def test_retries_go_through_the_rate_limiter(monkeypatch):
+    fetcher = scraper.HttpFetcher(retries=3)
+    fetcher.session = FakeSession([FakeResponse(429, headers={'Retry-After': '7'}), requests.ConnectionError(), FakeResponse(200, 'page')])
+    waited_urls = []
+    monkeypatch.setattr(fetcher.rate_limiter, 'wait', waited_urls.append)
+    sleeps = []
+    monkeypatch.setattr(scraper.time, 'sleep', sleeps.append)
+    assert fetcher.fetch(f'{BASE_URL}/album/retried') == 'page'
+    assert waited_urls == [f'{BASE_URL}/album/retried'] * 3
+    assert sleeps == [7.0, 2]
+
+def test_retries_give_up(monkeypatch):
+    fetcher = scraper.HttpFetcher(retries=1)
+    fetcher.session = FakeSession([FakeResponse(503), FakeResponse(503)])
+    monkeypatch.setattr(scraper.time, 'sleep', lambda seconds: None)
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetch(f'{BASE_URL}/album/down')
@@ -0,0 +1,320 @@
+# Tests for hsmusicToSongs.py, run with python -m pytest
+# Requires pip install pytest on top of what hsmusicToSongs.py needs
+
+import datetime
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pytest
+
+import hsmusicToSongs as bake
+from benchmarkHsmusicToSongs import generate_synthetic_wiki
+
+def old_normalize_wiki_string(string: str) -> str:
+    # the slugging from before the precompiled regexes, every slug in the wiki was made with this one
+    if (string == 'MeGaLoVania'):
+        return 'MeGaLoVania'
+    elif (string == 'iRRRRRRRRECONCILA8LE'):
+        return 'iRRRRRRRRECONCILA8LE'
+    string = re.split(' ', string)
+    string = "-".join(string)
+    string = re.sub('&', 'and', string)
+    string = re.sub('[^a-zA-Z0-9\\-]', '', string)
+    string = re.sub('-{2,}', '-', string)
+    string = re.sub('^-+|-+$', '', string).lower()
+    return string
+
+# everything the real track names throw at the slugger, plus a few things they hopefully never will
+SLUG_ALPHABET = 'aAzZ09 -&_.,\'"!?()[]:;/\\~éüß–’♪日\t\n'
+
+@pytest.mark.parametrize('string', [
+    'MeGaLoVania',
+    'iRRRRRRRRECONCILA8LE',
+    'megalovania',
+    'MeGaLoVania ',
+    ' iRRRRRRRRECONCILA8LE',
+    'Sburban Jungle',
+    'Beatdown (Strider Style)',
+    'Rex Duodecim Angelus',
+    'Hearts & Diamonds',
+    'Crystalanthemums - Act 6 Act 6',
+    '--- Trailing & Leading ---',
+    'Pumpkin Cravings (Harlequin)',
+    'Frost – Can Town',
+    '',
+    ' ',
+    '&&&',
+])
+def test_normalize_wiki_string_known_names(string):
+    assert bake.normalize_wiki_string(string) == old_normalize_wiki_string(string)
+
+def test_normalize_wiki_string_matches_old_implementation():
+    rng = random.Random(612)
+    for _ in range(20000):
+        string = ''.join(rng.choice(SLUG_ALPHABET) for _ in range(rng.randint(0, 24)))
+        assert bake.normalize_wiki_string(string) == old_normalize_wiki_string(string), repr(string)
+
+def test_normalize_wiki_strings_matches_normalize_wiki_string():
+    strings = ['MeGaLoVania', 'iRRRRRRRRECONCILA8LE', 'Hearts & Diamonds', 'Sburban Jungle']
+    assert bake.normalize_wiki_strings(strings) == [old_normalize_wiki_string(string) for string in strings]
+
+def test_extraction_fingerprint_covers_slug_patterns(monkeypatch):
+    fingerprint = bake.get_extraction_fingerprint()
+    monkeypatch.setattr(bake, 'SLUG_REPEATED_DASHES', re.compile(r'-{3,}'))
+    assert bake.get_extraction_fingerprint() != fingerprint
+
+# a small synthetic wiki whose bake is checked in under test_fixtures/, regenerate it with
+# python test_hsmusicToSongs.py --regenerate after a change that is meant to move the output
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'test_fixtures', 'bake')
+FIXTURE_WIKI = {'n_albums': 12, 'tracks_per_album': 6, 'references_per_track': 3, 'fandom_ratio': 0.5}
+# looping the schedule all the way to the real END_DATETIME would only make the fixture bigger
+FIXTURE_END_DATETIME = bake.START_DATETIME + datetime.timedelta(days=40)
+
+def bake_fixture_wiki(data_path: str, output_path: str):
+    album_path = os.path.join(data_path, 'album')
+    generate_synthetic_wiki(album_path, **FIXTURE_WIKI)
+    album_records = list(bake.iter_album_records(album_path, use_cache=False))
+    original_values = {name: getattr(bake, name) for name in ['OUTPUT_PATH', 'RUN_REPORT_PATH', 'END_DATETIME', 'write_schedule_shards']}
+    write_schedule_shards = bake.write_schedule_shards
+    bake.OUTPUT_PATH = output_path
+    bake.RUN_REPORT_PATH = os.path.join(output_path, 'run_report.json')
+    bake.END_DATETIME = FIXTURE_END_DATETIME
+    bake.write_schedule_shards = lambda game_schedule: write_schedule_shards(game_schedule, os.path.join(output_path, 'schedule'))
+    try:
+        bake.get_game_data(append=False, album_records=album_records)
+    finally:
+        for name, value in original_values.items():
+            setattr(bake, name, value)
+
+def test_bake_matches_fixture(tmp_path):
+    output_path = str(tmp_path / 'static')
+    os.makedirs(output_path)
+    bake_fixture_wiki(str(tmp_path / 'hsmusic-data'), output_path)
+    for output_file in ['game_songs.json', 'game_motifs.json']:
+        with open(os.path.join(output_path, output_file), 'r', encoding='utf-8') as f:
+            baked = json.load(f)
+        with open(os.path.join(FIXTURE_PATH, output_file), 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+        assert baked == expected, output_file
+
+def test_superseded_schedule_shards_outlive_the_grace_period(tmp_path):
+    with open(os.path.join(FIXTURE_PATH, 'game_songs.json'), 'r', encoding='utf-8') as f:
+        game_songs_json = json.load(f)
+    shards_path = str(tmp_path / 'schedule')
+    old_files = set(bake.write_schedule_shards(bake.get_game_schedule(game_songs_json), shards_path)['months'].values())
+    game_songs_json[-1] = {**game_songs_json[-1], 'name': 'Changed'}
+    new_files = set(bake.write_schedule_shards(bake.get_game_schedule(game_songs_json), shards_path)['months'].values())
+    superseded_files = old_files - new_files
+    assert superseded_files
+    assert set(os.listdir(shards_path)) == old_files | new_files | {'manifest.json'}
+
+    expired = time.time() - (bake.SCHEDULE_SHARD_GRACE_DAYS + 1) * 24 * 60 * 60
+    for shard_file in old_files:
+        os.utime(os.path.join(shards_path, shard_file), (expired, expired))
+    bake.write_schedule_shards(bake.get_game_schedule(game_songs_json), shards_path)
+    assert set(os.listdir(shards_path)) == new_files | {'manifest.json'}
+
+@pytest.fixture
+def album_path(tmp_path):
+    album_path = str(tmp_path / 'hsmusic-data' / 'album')
+    generate_synthetic_wiki(album_path, **FIXTURE_WIKI)
+    return album_path
+
+def test_snapshot_round_trip(album_path, tmp_path):
+    snapshot_path = str(tmp_path / 'hsmusic-data.sqlite')
+    album_records = list(bake.iter_album_records(album_path, use_cache=False))
+    assert list(bake.snapshot_album_records(iter(album_records), album_path, snapshot_path)) == album_records
+    connection = bake.open_snapshot(album_path, snapshot_path)
+    assert connection is not None
+    try:
+        assert list(bake.iter_snapshot_album_records(connection)) == album_records
+    finally:
+        connection.close()
+
+def test_snapshot_goes_stale_when_an_album_changes(album_path, tmp_path):
+    snapshot_path = str(tmp_path / 'hsmusic-data.sqlite')
+    for _ in bake.snapshot_album_records(bake.iter_album_records(album_path, use_cache=False), album_path, snapshot_path):
+        pass
+    album_file = os.path.join(album_path, sorted(os.listdir(album_path))[0])
+    stat = os.stat(album_file)
+    os.utime(album_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert bake.open_snapshot(album_path, snapshot_path) is None
+
+def test_unreadable_snapshot_gets_rebuilt(album_path, tmp_path):
+    snapshot_path = str(tmp_path / 'hsmusic-data.sqlite')
+    with open(snapshot_path, 'wb') as f:
+        f.write(b'not a database at all' * 100)
+    assert bake.open_snapshot(album_path, snapshot_path) is None
+
+    # one from before the meta table
+    os.remove(snapshot_path)
+    connection = sqlite3.connect(snapshot_path)
+    connection.execute('CREATE TABLE albums (album_index INTEGER PRIMARY KEY, album_name)')
+    connection.close()
+    assert bake.open_snapshot(album_path, snapshot_path) is None
+
+    # load_game_data parses everything again and writes a fresh one over it
+    bake.load_game_data(use_cache=False, album_path=album_path, snapshot_path=snapshot_path)
+    assert bake.open_snapshot(album_path, snapshot_path) is not None
+
+def test_no_cache_skips_the_snapshot(album_path, tmp_path, monkeypatch):
+    snapshot_path = str(tmp_path / 'hsmusic-data.sqlite')
+    monkeypatch.setattr(bake, 'CACHE_PATH', str(tmp_path / 'cache'))
+    bake.load_game_data(album_path=album_path, snapshot_path=snapshot_path)
+    monkeypatch.setattr(bake, 'run_report', bake.RunReport())
+    bake.load_game_data(album_path=album_path, snapshot_path=snapshot_path)
+    assert bake.run_report.counters['albumsFromSnapshot'] == FIXTURE_WIKI['n_albums']
+    monkeypatch.setattr(bake, 'run_report', bake.RunReport())
+    bake.load_game_data(use_cache=False, album_path=album_path, snapshot_path=snapshot_path)
+    assert bake.run_report.counters['albumsFromSnapshot'] == 0
+    assert bake.run_report.counters['albumsParsed'] == FIXTURE_WIKI['n_albums']
+
+def iter_counted_album_records(album_path, monkeypatch, **kwargs):
+    # the records plus how many albums got parsed rather than read from the cache
+    monkeypatch.setattr(bake, 'run_report', bake.RunReport())
+    album_records = list(bake.iter_album_records(album_path, **kwargs))
+    return album_records, bake.run_report.counters['albumsParsed']
+
+def test_cached_records_match_parsed_ones(album_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(bake, 'CACHE_PATH', str(tmp_path / 'cache'))
+    parsed_records, _ = iter_counted_album_records(album_path, monkeypatch, use_cache=False)
+    assert iter_counted_album_records(album_path, monkeypatch) == (parsed_records, FIXTURE_WIKI['n_albums'])
+    assert iter_counted_album_records(album_path, monkeypatch) == (parsed_records, 0)
+
+def test_cache_only_reparses_what_changed(album_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(bake, 'CACHE_PATH', str(tmp_path / 'cache'))
+    iter_counted_album_records(album_path, monkeypatch)
+
+    # an edited album file only invalidates its own entry
+    with open(os.path.join(album_path, 'synthetic-album-3.yaml'), 'a', encoding='utf8') as f:
+        f.write('---\nTrack: Synthetic Track 3-extra\nArtists:\n- Synthetic Artist 0\n')
+    album_records, n_parsed = iter_counted_album_records(album_path, monkeypatch)
+    assert n_parsed == 1
+    assert album_records == iter_counted_album_records(album_path, monkeypatch, use_cache=False)[0]
+
+    # anything extract_album depends on invalidates every entry
+    monkeypatch.setattr(bake, 'EXCLUDED_ALBUMS', [*bake.EXCLUDED_ALBUMS, 'synthetic-album-5'])
+    album_records, n_parsed = iter_counted_album_records(album_path, monkeypatch)
+    assert n_parsed == FIXTURE_WIKI['n_albums']
+    assert album_records == iter_counted_album_records(album_path, monkeypatch, use_cache=False)[0]
+    assert [album_record['status'] for album_record in album_records if album_record['album_name'] == 'synthetic-album-5'] == ['excluded']
+    assert iter_counted_album_records(album_path, monkeypatch)[1] == 0
+
+def test_prune_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    cache_path = tmp_path / 'cache'
+    cache_path.mkdir()
+    monkeypatch.setattr(bake, 'CACHE_PATH', str(cache_path))
+    now = time.time()
+    for index in range(5):
+        entry = cache_path / f'album-{index}.hash.pickle'
+        entry.write_bytes(b'x' * 100)
+        os.utime(entry, (now - 100 + index, now - 100 + index))
+    # reading an entry makes it the most recently used one
+    os.utime(cache_path / 'album-0.hash.pickle')
+    bake.prune_cache(250)
+    assert sorted(os.listdir(cache_path)) == ['album-0.hash.pickle', 'album-4.hash.pickle']
+
+def make_song(day: str, slug: str = None) -> bake.Song:
+    return bake.Song(
+        slug=slug or f'song-{day}', name=f'Song {day}', artist=('Synthetic Artist 0',), album_name='Synthetic Album 0',
+        leitmotifs=('track:a', 'track:b', 'track:c'), samples=(), n_leitmotifs=3, wiki_url='', image_url='',
+        is_official=True, is_fandom=False, url='https://youtu.be/x', url_type='youtube', day=day
+    )
+
+def make_songs(first_day: str, n_days: int) -> list:
+    days = [first_day]
+    for _ in range(n_days - 1):
+        days.append(bake.get_next_day(days[-1]))
+    return [make_song(day) for day in days]
+
+def test_schedule_store_skips_locked_days_and_stops_at_gaps(tmp_path):
+    history_path = str(tmp_path / 'schedule_history.jsonl')
+    schedule_store = bake.ScheduleStore(history_path)
+    assert schedule_store.lock(make_songs('2025-01-01', 10), '2025-01-05') == 5
+    # the days up to the 5th are locked already, so only the 6th and 7th get added, even though the songs differ
+    assert schedule_store.lock([make_song(song.day, 'other') for song in make_songs('2025-01-01', 10)], '2025-01-07') == 2
+    assert [song.slug for song in schedule_store.songs[-3:]] == ['song-2025-01-05', 'other', 'other']
+    # a gap right after the last locked day stops it, nothing after the gap can be locked
+    gapped_songs = make_songs('2025-01-09', 5)
+    assert schedule_store.lock(gapped_songs, '2025-01-20') == 0
+    schedule_store.save()
+    assert [song.day for song in bake.ScheduleStore(history_path).songs] == [song.day for song in make_songs('2025-01-01', 7)]
+
+def test_schedule_store_recovers_from_a_half_written_line(tmp_path):
+    history_path = str(tmp_path / 'schedule_history.jsonl')
+    schedule_store = bake.ScheduleStore(history_path)
+    schedule_store.lock(make_songs('2025-01-01', 3), '2025-01-03')
+    schedule_store.save()
+    with open(history_path, 'ab') as f:
+        f.write(b'{"slug": "half-writ')
+    with open(history_path, 'rb') as f:
+        contents = f.read()
+
+    schedule_store = bake.ScheduleStore(history_path)
+    assert schedule_store.get_last_day() == '2025-01-03'
+    # loading alone leaves the file as it was
+    with open(history_path, 'rb') as f:
+        assert f.read() == contents
+    schedule_store.lock(make_songs('2025-01-04', 1), '2025-01-04')
+    schedule_store.save()
+    assert [song.day for song in bake.ScheduleStore(history_path).songs] == [song.day for song in make_songs('2025-01-01', 4)]
+
+@pytest.fixture
+def bake_paths(tmp_path, monkeypatch):
+    # points every output of get_game_data at tmp_path and pins the day that gets locked
+    output_path = str(tmp_path / 'static')
+    os.makedirs(output_path)
+    history_path = str(tmp_path / 'schedule_history.jsonl')
+    write_schedule_shards = bake.write_schedule_shards
+    monkeypatch.setattr(bake, 'OUTPUT_PATH', output_path)
+    monkeypatch.setattr(bake, 'RUN_REPORT_PATH', os.path.join(output_path, 'run_report.json'))
+    monkeypatch.setattr(bake, 'SCHEDULE_HISTORY_PATH', history_path)
+    monkeypatch.setattr(bake, 'END_DATETIME', FIXTURE_END_DATETIME)
+    monkeypatch.setattr(bake, 'write_schedule_shards', lambda game_schedule: write_schedule_shards(game_schedule, os.path.join(output_path, 'schedule')))
+    # the fixture schedule wraps on 2025-01-15, so this locks some of the loop too
+    monkeypatch.setattr(bake, 'get_lock_day', lambda: '2025-01-20')
+    return output_path, history_path
+
+def test_store_false_leaves_the_history_alone(album_path, bake_paths):
+    output_path, history_path = bake_paths
+    album_records = list(bake.iter_album_records(album_path, use_cache=False))
+    bake.get_game_data(store=False, album_records=album_records)
+    assert not os.path.exists(history_path)
+
+    bake.get_game_data(album_records=album_records)
+    with open(history_path, 'rb') as f:
+        contents = f.read()
+    bake.get_game_data(store=False, album_records=album_records)
+    with open(history_path, 'rb') as f:
+        assert f.read() == contents
+
+def test_rebake_reproduces_the_loop_after_wrapped_locked_days(album_path, bake_paths):
+    output_path, history_path = bake_paths
+    album_records = list(bake.iter_album_records(album_path, use_cache=False))
+    game_songs = bake.get_game_data(album_records=album_records)
+    locked_songs = bake.ScheduleStore(history_path).songs
+    assert locked_songs[-1].day == '2025-01-20'
+    # the locked days already went past the first replayed song
+    assert len(set(song.slug for song in locked_songs)) < len(locked_songs)
+
+    assert bake.get_game_data(album_records=album_records) == game_songs
+    assert bake.ScheduleStore(history_path).songs == locked_songs
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['--regenerate']:
+        sys.exit('usage: python test_hsmusicToSongs.py --regenerate')
+    with tempfile.TemporaryDirectory() as temporary_path:
+        output_path = os.path.join(temporary_path, 'static')
+        os.makedirs(output_path)
+        bake_fixture_wiki(os.path.join(temporary_path, 'hsmusic-data'), output_path)
+        os.makedirs(FIXTURE_PATH, exist_ok=True)
+        for output_file in ['game_songs.json', 'game_motifs.json']:
+            shutil.copyfile(os.path.join(output_path, output_file), os.path.join(FIXTURE_PATH, output_file))
+    print(f'Wrote the expected bake to {FIXTURE_PATH}')